@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import ex_graphsearch as ex
+from compact_graph import CompactGraph
+
+# the graph of a worker process, memory mapped by init_worker()
+worker_graph = None
+
+
+def init_worker(prefix, names):
+    global worker_graph
+    worker_graph = CompactGraph.load(prefix, names=names)
+
+
+def run_query(graph, algorithm, start, goals, heuristic):
+    """
+    Runs a single search and returns its result in a form that can be
+    sent between processes.
+    :return: a tuple of the path cost and the list of state names from
+             start to goal, or None if no goal is reachable or a goal is
+             not in the graph
+    """
+    search = getattr(ex, algorithm)
+    try:
+        if heuristic is None:
+            node, _ = search(graph, start, goals)
+        else:
+            node, _ = search(graph, start, goals, heuristic)
+    except (ex.FailureException, ex.UnvalidGoalException):
+        return None
+    return node.path_cost, graph.path(node)
+
+
+def run_worker_query(query):
+    return run_query(worker_graph, *query)
+
+
+def run_queries(graph, queries, algorithm='uniform_cost_search',
+                heuristic=None, processes=None, prefix=None, chunksize=16):
+    """
+    Runs many independent searches on the same graph in a process pool.
+    The workers memory map the arrays of the graph read-only, so the
+    graph is neither copied nor pickled for each of them. Only the state
+    names are sent to each worker once, as the names file holds them as
+    str and the workers have to use the same names as this process.
+
+    :param graph: A CompactGraph or a nested dict
+    :param queries: A list of (start, goals) tuples
+    :param algorithm: The name of a search function in ex_graphsearch,
+                      which returns a (node, fringe) tuple, e.g.
+                      'uniform_cost_search' or 'a_star_search'
+    :param heuristic: The heuristic for A* searches. It has to be a
+                      module level function, which gets ids
+    :param processes: The number of worker processes, by default one per
+                      cpu. With 1 the queries are run in this process
+    :param prefix: The prefix of files written by CompactGraph.save() for
+                   this graph. If None, they are written to a temporary
+                   directory
+    :param chunksize: The number of queries sent to a worker at once
+    :return: A list with one result per query in the same order, each a
+             tuple of the path cost and the list of state names from the
+             start to the goal or None if no goal is reachable or a
+             goal is not in the graph
+    """
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_dict(graph)
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    tasks = [(algorithm, start, goals, heuristic) for start, goals in queries]
+
+    if processes == 1 or len(tasks) <= 1:
+        return [run_query(graph, *task) for task in tasks]
+
+    directory = None
+    if prefix is None:
+        directory = tempfile.mkdtemp()
+        prefix = os.path.join(directory, 'graph')
+        graph.save(prefix)
+    pool = multiprocessing.Pool(processes, init_worker,
+                                (prefix, graph.names))
+    try:
+        return pool.map(run_worker_query, tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+        if directory is not None:
+            shutil.rmtree(directory)
@@ -0,0 +1,432 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import time
+from collections import OrderedDict
+import numpy as np
+import ex_graphsearch as ex
+from compact_graph import CompactGraph
+from heuristics import HeuristicTable, LandmarkHeuristic
+from search_stats import SearchStats
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+# the searches that get a heuristic
+HEURISTIC_SEARCHES = ['a_star_search', 'ida_star_search', 'sma_star_search',
+                      'bidirectional_a_star_search']
+# the searches that are run with graph_search=True
+GRAPH_SEARCHES = ['breadth_first_search', 'uniform_cost_search',
+                  'iterative_deepening_search', 'a_star_search']
+ALGORITHMS = ['breadth_first_search', 'uniform_cost_search',
+              'iterative_deepening_search', 'bidirectional_uniform_cost_search',
+              'a_star_search', 'ida_star_search', 'sma_star_search',
+              'bidirectional_a_star_search']
+HEURISTICS = ['zero', 'euclidean', 'euclidean_table', 'landmarks']
+# HeuristicTables only hold the costs to the goals, the bidirectional
+# searches also need them towards the start
+TABLE_HEURISTICS = ['euclidean_table']
+
+
+class BudgetExceeded(Exception):
+    """
+    An exception, that is raised when a search expands more nodes or
+    runs longer than its budget allows
+    """
+    pass
+
+
+class BudgetStats(SearchStats):
+    """
+    SearchStats that stop the search with a BudgetExceeded exception
+    after max_expansions expansions or max_seconds seconds.
+    """
+    def __init__(self, max_expansions=None, max_seconds=None):
+        super(BudgetStats, self).__init__()
+        self.max_expansions = max_expansions
+        self.deadline = None
+        if max_seconds is not None:
+            self.deadline = time.time() + max_seconds
+
+    def expand(self, generated, fringe_size):
+        super(BudgetStats, self).expand(generated, fringe_size)
+        if self.max_expansions is not None and \
+                self.expanded > self.max_expansions:
+            raise BudgetExceeded
+        if self.deadline is not None and time.time() > self.deadline:
+            raise BudgetExceeded
+
+
+class EuclideanHeuristic(object):
+    """
+    The straight line distance between two ids, computed on every call.
+    """
+    def __init__(self, points):
+        self.points = [tuple(point) for point in np.asarray(points).tolist()]
+
+    def __call__(self, u, v):
+        (x1, y1), (x2, y2) = self.points[u], self.points[v]
+        return ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
+
+
+def zero_heuristic(u, v):
+    return 0
+
+
+def grid_graph(n, seed=None):
+    """
+    A 4-connected square grid with about n nodes and unit edge costs.
+    :param n: The number of nodes, rounded down to a square number
+    :param seed: Unused, grids are not random
+    :return: a tuple of the CompactGraph and a numpy array with shape
+             (n, 2) with the coordinates of each id
+    """
+    side = max(2, int(np.sqrt(n)))
+    ids = np.arange(side * side).reshape(side, side)
+    pairs = [(ids[:, :-1].ravel(), ids[:, 1:].ravel()),
+             (ids[:-1, :].ravel(), ids[1:, :].ravel())]
+    sources = np.concatenate([a for a, b in pairs] + [b for a, b in pairs])
+    targets = np.concatenate([b for a, b in pairs] + [a for a, b in pairs])
+    rows, columns = np.divmod(np.arange(side * side), side)
+    points = np.column_stack([columns, rows]).astype(float)
+    graph = CompactGraph.from_edges(range(side * side), sources, targets,
+                                    np.ones(len(sources)))
+    return graph, points
+
+
+def random_geometric_graph(n, degree=8, seed=None):
+    """
+    A random geometric graph: n points are drawn uniformly from a square
+    with area n and all points closer than a radius are connected. The
+    radius is chosen for the given expected degree, the edge costs are
+    the distances.
+
+    :param n: The number of nodes
+    :param degree: The expected number of neighbours of a node
+    :param seed: The seed of the random number generator
+    :return: a tuple of the CompactGraph and a numpy array with shape
+             (n, 2) with the coordinates of each id
+    """
+    random = np.random.RandomState(seed)
+    side = np.sqrt(n)
+    points = random.uniform(0, side, (n, 2))
+    radius = np.sqrt(degree / np.pi)
+
+    # points are sorted into square cells with the radius as side length,
+    # so neighbours are in the same or an adjacent cell
+    cells = max(1, int(side / radius))
+    cell = np.minimum((points / side * cells).astype(np.int64), cells - 1)
+    cell_ids = cell[:, 0] * cells + cell[:, 1]
+    order = np.argsort(cell_ids, kind='mergesort')
+    starts = np.searchsorted(cell_ids[order], np.arange(cells * cells + 1))
+
+    sources, targets = [], []
+    # each pair of adjacent cells is visited once
+    for dx, dy in [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]:
+        x, y = cell[:, 0] + dx, cell[:, 1] + dy
+        u = np.nonzero((x >= 0) & (x < cells) & (y >= 0) & (y < cells))[0]
+        other = x[u] * cells + y[u]
+        counts = starts[other + 1] - starts[other]
+        total = counts.sum()
+        # all pairs of u with the points of its adjacent cell
+        positions = np.arange(total) - np.repeat(np.cumsum(counts) - counts,
+                                                 counts)
+        v = order[np.repeat(starts[other], counts) + positions]
+        u = np.repeat(u, counts)
+        close = ((points[u] - points[v]) ** 2).sum(axis=1) <= radius ** 2
+        if (dx, dy) == (0, 0):
+            close &= u < v
+        sources.append(u[close])
+        targets.append(v[close])
+
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    weights = np.sqrt(((points[sources] - points[targets]) ** 2).sum(axis=1))
+    graph = CompactGraph.from_edges(range(n),
+                                    np.concatenate([sources, targets]),
+                                    np.concatenate([targets, sources]),
+                                    np.concatenate([weights, weights]))
+    return graph, points
+
+
+GRAPHS = OrderedDict([('grid', grid_graph),
+                      ('geometric', random_geometric_graph)])
+
+
+def make_heuristic(name, graph, points, goal, landmarks=None):
+    """
+    Builds a heuristic for the searches to one goal id.
+    :param name: One of HEURISTICS
+    :param landmarks: A LandmarkHeuristic for the graph, required for
+                      'landmarks'
+    """
+    if name == 'zero':
+        return zero_heuristic
+    if name == 'euclidean':
+        return EuclideanHeuristic(points)
+    if name == 'euclidean_table':
+        return HeuristicTable.from_coordinates(graph, points, [goal])
+    if name == 'landmarks':
+        return landmarks
+    raise ValueError("Unknown heuristic " + name)
+
+
+def search(algorithm, graph, start, goal, heuristic, stats):
+    """
+    Runs one search from start to goal.
+    :return: the found node
+    """
+    args = [graph, start, [goal]]
+    if algorithm in HEURISTIC_SEARCHES:
+        args.append(heuristic)
+    kwargs = {'stats': stats}
+    if algorithm in GRAPH_SEARCHES:
+        kwargs['graph_search'] = True
+    result = getattr(ex, algorithm)(*args, **kwargs)
+    return result[0] if isinstance(result, tuple) else result
+
+
+def max_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(algorithm, graph, start, goal, heuristic, max_expansions=None,
+            max_seconds=None):
+    """
+    Times one search.
+    :return: An OrderedDict with the status ('found', 'failure', 'cutoff'
+             or 'budget'), the path cost, the time in seconds, the
+             numbers collected by a SearchStats and rss_growth, the kB by
+             which the search raised the peak memory of the process
+    """
+    rss = max_rss()
+    stats = BudgetStats(max_expansions, max_seconds)
+    cost, status = None, 'found'
+    begin = time.time()
+    try:
+        node = search(algorithm, graph, start, goal, heuristic, stats)
+        cost = node.path_cost
+    except ex.FailureException:
+        status = 'failure'
+    except ex.CutoffException:
+        status = 'cutoff'
+    except BudgetExceeded:
+        status = 'budget'
+    seconds = time.time() - begin
+
+    result = OrderedDict([('status', status), ('cost', cost),
+                          ('seconds', seconds)])
+    result.update(stats.as_dict())
+    del result['algorithm']
+    result['expansions_per_second'] = stats.expanded / seconds \
+        if seconds > 0 else None
+    result['rss_growth'] = stats.max_rss - rss if rss is not None else None
+    return result
+
+
+def send_measurement(connection, *args):
+    connection.send(measure(*args))
+    connection.close()
+
+
+def measure_in_process(*args):
+    """
+    measure() in a forked child process. The peak memory of a process
+    never decreases, but a child starts with the current memory of this
+    process, so its max_rss is not raised by the graphs and searches
+    before and its rss_growth is the memory of this search alone.
+    :param args: The arguments of measure()
+    """
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=send_measurement,
+                                      args=(sender,) + args)
+    process.start()
+    sender.close()
+    try:
+        return receiver.recv()
+    except EOFError:
+        process.join()
+        raise RuntimeError("the search process exited with code {}".format(
+            process.exitcode))
+    finally:
+        receiver.close()
+        process.join()
+
+
+def run_benchmark(graphs=('grid', 'geometric'), sizes=(1000, 10000),
+                  algorithms=ALGORITHMS, heuristics=HEURISTICS, queries=3,
+                  max_expansions=200000, max_seconds=2.0, seed=0,
+                  landmarks=8, isolate=True, log=None):
+    """
+    Runs every algorithm with every heuristic on random queries in
+    generated graphs. Searches without a heuristic are run once per
+    query.
+
+    :param graphs: Names of graph generators in GRAPHS
+    :param sizes: The numbers of nodes of the generated graphs
+    :param algorithms: Names of searches in ex_graphsearch
+    :param heuristics: Names in HEURISTICS
+    :param queries: The number of random (start, goal) pairs per graph
+    :param max_expansions: A search is stopped with status 'budget'
+                           after this many expansions, None for no limit
+    :param max_seconds: A search is also stopped with status 'budget'
+                        after this many seconds, None for no limit
+    :param seed: The seed for the graphs and the queries
+    :param landmarks: The number of landmarks of the 'landmarks' heuristic
+    :param isolate: If True every search runs in a child process of its
+                    own, see measure_in_process()
+    :param log: An optional function that gets each result when it is done
+    :return: A list of OrderedDicts, one per measurement. Without isolate
+             max_rss is the peak of the whole process so far
+    """
+    run = measure_in_process if isolate else measure
+    results = []
+    for graph_name in graphs:
+        for size in sizes:
+            begin = time.time()
+            graph, points = GRAPHS[graph_name](size, seed=seed)
+            info = OrderedDict([
+                ('graph', graph_name), ('nodes', len(graph)),
+                ('edges', graph.num_edges()),
+                ('graph_seconds', time.time() - begin),
+                ('graph_bytes', sum(np.asarray(a).nbytes for a in
+                                    [graph.offsets, graph.targets,
+                                     graph.weights]))])
+
+            landmark_heuristic, landmark_seconds = None, None
+            if 'landmarks' in heuristics and \
+                    any(a in HEURISTIC_SEARCHES for a in algorithms):
+                begin = time.time()
+                landmark_heuristic = LandmarkHeuristic.from_graph(graph,
+                                                                  landmarks)
+                landmark_seconds = time.time() - begin
+
+            random = np.random.RandomState(seed)
+            for query in range(queries):
+                start, goal = [int(i) for i in
+                               random.choice(len(graph), 2, replace=False)]
+                for algorithm in algorithms:
+                    names = heuristics if algorithm in HEURISTIC_SEARCHES \
+                        else [None]
+                    for heuristic_name in names:
+                        if algorithm.startswith('bidirectional') and \
+                                heuristic_name in TABLE_HEURISTICS:
+                            continue
+                        begin = time.time()
+                        heuristic = None
+                        if heuristic_name is not None:
+                            heuristic = make_heuristic(heuristic_name, graph,
+                                                       points, goal,
+                                                       landmark_heuristic)
+                        prepare_seconds = time.time() - begin
+                        if heuristic_name == 'landmarks':
+                            prepare_seconds = landmark_seconds
+
+                        result = OrderedDict(info)
+                        result.update([('query', query), ('start', start),
+                                       ('goal', goal),
+                                       ('algorithm', algorithm),
+                                       ('heuristic', heuristic_name),
+                                       ('prepare_seconds', prepare_seconds)])
+                        result.update(run(algorithm, graph, start, goal,
+                                          heuristic, max_expansions,
+                                          max_seconds))
+                        results.append(result)
+                        if log is not None:
+                            log(result)
+    return results
+
+
+def write_results(filename, results, label=None):
+    """
+    Writes benchmark results as JSON together with a description of the
+    machine, so results of different versions can be compared.
+    """
+    document = OrderedDict([('label', label),
+                            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                            ('python', platform.python_version()),
+                            ('platform', platform.platform()),
+                            ('numpy', np.__version__),
+                            ('results', results)])
+    with open(filename, 'w') as f:
+        json.dump(document, f, indent=1)
+
+
+def read_results(filename):
+    with open(filename, 'r') as f:
+        return json.load(f, object_pairs_hook=OrderedDict)
+
+
+def compare(old, new):
+    """
+    Compares the results of two benchmark runs with the same settings.
+    :param old: A document read by read_results()
+    :param new: A document read by read_results()
+    :return: A list of (graph, nodes, algorithm, heuristic, old seconds,
+             new seconds) tuples, one for each combination in both runs
+             with the seconds summed over all queries
+    """
+    def totals(document):
+        seconds = OrderedDict()
+        for result in document['results']:
+            key = (result['graph'], result['nodes'], result['algorithm'],
+                   result['heuristic'])
+            seconds[key] = seconds.get(key, 0.0) + result['seconds']
+        return seconds
+
+    old_seconds, new_seconds = totals(old), totals(new)
+    return [key + (old_seconds[key], new_seconds[key])
+            for key in new_seconds if key in old_seconds]
+
+
+def print_result(result):
+    print "{graph:<9} {nodes:>8} {algorithm:<34} {heuristic!s:<16} " \
+          "{status:<8} {seconds:8.3f}s {expanded:>8} expanded".format(**result)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the searches on generated graphs")
+    parser.add_argument('--graphs', nargs='+', default=list(GRAPHS),
+                        choices=list(GRAPHS))
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        default=[1000, 10000])
+    parser.add_argument('--algorithms', nargs='+', default=ALGORITHMS,
+                        choices=ALGORITHMS)
+    parser.add_argument('--heuristics', nargs='+', default=HEURISTICS,
+                        choices=HEURISTICS)
+    parser.add_argument('--queries', type=int, default=3)
+    parser.add_argument('--max-expansions', type=int, default=200000)
+    parser.add_argument('--max-seconds', type=float, default=2.0,
+                        help="the time budget of each search")
+    parser.add_argument('--no-isolate', dest='isolate',
+                        action='store_false',
+                        help="runs the searches in this process, then "
+                             "max_rss is the peak of the whole run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--label', default=None,
+                        help="a name for this run, e.g. the version")
+    parser.add_argument('--compare', metavar='OLD_RESULTS',
+                        help="compares the new results with older ones")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.graphs, args.sizes, args.algorithms,
+                            args.heuristics, args.queries,
+                            args.max_expansions, args.max_seconds, args.seed,
+                            isolate=args.isolate, log=print_result)
+    write_results(args.output, results, args.label)
+    print "Results written to", args.output
+
+    if args.compare:
+        old, new = read_results(args.compare), read_results(args.output)
+        for graph, nodes, algorithm, heuristic, before, after in \
+                compare(old, new):
+            print "{:<9} {:>8} {:<34} {!s:<16} {:8.3f}s -> {:8.3f}s ({:+.0%})" \
+                .format(graph, nodes, algorithm, heuristic, before, after,
+                        after / before - 1 if before > 0 else 0)
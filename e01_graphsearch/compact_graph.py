@@ -0,0 +1,177 @@
+from array import array
+from numbers import Integral
+
+try:
+    import numpy as np
+except ImportError:
+    # only from_edges(), save() and load() need numpy, the searches on
+    # dicts and on graphs from from_dict() do not
+    np = None
+
+
+class CompactGraph(object):
+    """
+    A read-only weighted graph in compressed sparse row (CSR) form.
+
+    Every state name is interned to an integer id. The neighbours of the
+    node with id u are targets[offsets[u]:offsets[u + 1]] and the matching
+    edge costs are weights[offsets[u]:offsets[u + 1]]. The searches in
+    ex_graphsearch work directly on the ids, i.e. node.state is an int
+    when a CompactGraph is searched. Use names[node.state] or path(node)
+    to translate the result back.
+
+    Examples:
+    cg = CompactGraph.from_dict(sbahn)
+    cg.index('Vaihingen')  # returns the id of a station
+    cg.names[3]  # returns the name of the station with id 3
+    list(cg.neighbours(3))  # returns (id, cost) tuples of the neighbours
+    cg.save('sbahn')  # writes the arrays as .npy files
+    cg = CompactGraph.load('sbahn')  # memory maps them again
+    """
+    def __init__(self, names, offsets, targets, weights):
+        """
+        The constructor for a CompactGraph. Usually you want to use
+        CompactGraph.from_dict() instead.
+        :param names: A list with the name of each id
+        :param offsets: A sequence of len(names) + 1 edge offsets
+        :param targets: A sequence with the target id of each edge
+        :param weights: A sequence with the cost of each edge
+
+        The sequences can be array.array or numpy arrays (also memory
+        mapped ones).
+        """
+        self.names = names
+        self.ids = dict((name, i) for i, name in enumerate(names))
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+    @classmethod
+    def from_dict(cls, graph):
+        """
+        Builds a CompactGraph from a nested dict like `graph` or `sbahn`
+        in data.py. Ids are given in the iteration order of the dict,
+        states that only appear as neighbours are appended at the end.
+        :param graph: A dict mapping each state to a dict of
+                      neighbour -> cost
+        :return: A CompactGraph
+        """
+        names = list(graph)
+        ids = dict((name, i) for i, name in enumerate(names))
+        integral = True
+        for state in graph:
+            for neighbour, cost in graph[state].items():
+                if neighbour not in ids:
+                    ids[neighbour] = len(names)
+                    names.append(neighbour)
+                if not isinstance(cost, (int, long)):
+                    integral = False
+
+        offsets = array('i', [0])
+        targets = array('i')
+        weights = array('l' if integral else 'd')
+        for state in names:
+            for neighbour, cost in graph.get(state, {}).items():
+                targets.append(ids[neighbour])
+                weights.append(cost)
+            offsets.append(len(targets))
+
+        return cls(names, offsets, targets, weights)
+
+    @classmethod
+    def from_edges(cls, names, sources, targets, weights):
+        """
+        Builds a CompactGraph from parallel edge arrays in any order.
+        Edges with the same source keep their order.
+        :param names: A list with the name of each id
+        :param sources: A sequence with the source id of each edge
+        :param targets: A sequence with the target id of each edge
+        :param weights: A sequence with the cost of each edge
+        :return: A CompactGraph with numpy arrays
+        """
+        sources = np.asarray(sources, dtype=np.int32)
+        order = np.argsort(sources, kind='mergesort')
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(names)), out=offsets[1:])
+        return cls(names, offsets,
+                   np.asarray(targets, dtype=np.int32)[order],
+                   np.asarray(weights)[order])
+
+    def index(self, name):
+        """
+        Returns the id of a state. Ids are not accepted, on graphs with
+        int names they could not be told apart from names. Callers that
+        already hold an id use it directly or check it with check_id().
+        :param name: A state name
+        :return: An int
+        """
+        return self.ids[name]
+
+    def check_id(self, u):
+        """
+        Returns u if it is an id of this graph, otherwise a KeyError is
+        raised.
+        :param u: An int
+        :return: u
+        """
+        if not isinstance(u, Integral) or not 0 <= u < len(self.names):
+            raise KeyError(u)
+        return u
+
+    def neighbours(self, u):
+        """
+        Returns the neighbours of the node with id u.
+        :param u: An id
+        :return: A list of (id, cost) tuples
+        """
+        start, end = self.offsets[u], self.offsets[u + 1]
+        return zip(self.targets[start:end].tolist(),
+                   self.weights[start:end].tolist())
+
+    def path(self, node):
+        """
+        Translates the path to a search node back to state names.
+        :param node: An ex_graphsearch.Node whose states are ids
+        :return: A list of names from the start to node
+        """
+        return [self.names[state] for state in node.path()]
+
+    def save(self, prefix):
+        """
+        Writes the arrays to prefix + '_offsets.npy', prefix +
+        '_targets.npy' and prefix + '_weights.npy' and the names to
+        prefix + '_names.txt'
+        """
+        np.save(prefix + '_offsets.npy', np.asarray(self.offsets))
+        np.save(prefix + '_targets.npy', np.asarray(self.targets))
+        np.save(prefix + '_weights.npy', np.asarray(self.weights))
+        with open(prefix + '_names.txt', 'w') as f:
+            for name in self.names:
+                f.write(str(name) + '\n')
+
+    @classmethod
+    def load(cls, prefix, mmap=True, names=None):
+        """
+        Loads a graph written by save().
+        :param mmap: If True the arrays are memory mapped read-only
+                     instead of being read into memory
+        :param names: The list of state names. If None they are read from
+                      the names file, where they are written as str
+        :return: A CompactGraph
+        """
+        mode = 'r' if mmap else None
+        arrays = [np.load(prefix + suffix, mmap_mode=mode) for suffix in
+                  ['_offsets.npy', '_targets.npy', '_weights.npy']]
+        if names is None:
+            with open(prefix + '_names.txt', 'r') as f:
+                names = [line.rstrip('\n') for line in f]
+        return cls(names, *arrays)
+
+    def num_edges(self):
+        return len(self.targets)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
@@ -0,0 +1,295 @@
+import heapq
+import numpy as np
+from compact_graph import CompactGraph
+
+
+def witness_search(out_edges, source, excluded, targets, max_cost, limit):
+    """
+    A uniform cost search from source which does not pass excluded. It
+    stops when all targets are settled, when max_cost is exceeded or
+    after limit settled states.
+
+    :param out_edges: A list with a dict neighbour -> (cost, middle) for
+                      each id
+    :return: A dict with the distances of the settled states
+    """
+    distances = {source: 0}
+    settled = {}
+    heap = [(0, source)]
+    remaining = set(targets)
+    while heap and remaining and len(settled) < limit:
+        distance, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        if distance > max_cost:
+            break
+        settled[u] = distance
+        remaining.discard(u)
+        for v, (cost, _) in out_edges[u].items():
+            if v == excluded:
+                continue
+            if distance + cost < distances.get(v, float('inf')):
+                distances[v] = distance + cost
+                heapq.heappush(heap, (distance + cost, v))
+    return settled
+
+
+def to_csr(edges):
+    """
+    Converts a list with a dict neighbour -> (cost, middle) for each id
+    into CSR arrays.
+    :return: A tuple of the offsets, targets, weights and middles arrays
+    """
+    offsets, targets, weights, middles = [0], [], [], []
+    for adjacent in edges:
+        for v in sorted(adjacent):
+            cost, middle = adjacent[v]
+            targets.append(v)
+            weights.append(cost)
+            middles.append(middle)
+        offsets.append(len(targets))
+    return (np.array(offsets, dtype=np.int32),
+            np.array(targets, dtype=np.int32),
+            np.array(weights),
+            np.array(middles, dtype=np.int32))
+
+
+class ContractionHierarchy(object):
+    """
+    A contraction hierarchy for fast repeated shortest path queries.
+
+    During preprocessing the states are contracted one after another, in
+    the order given by their rank. Contracting a state removes it from the
+    graph and adds a shortcut edge for each shortest path that passed
+    through it. A query is then a bidirectional uniform cost search which
+    only follows edges to states of higher rank, so it settles only a
+    small part of the graph. Shortcuts remember the state they skip, which
+    is used to unpack them into the original path.
+
+    up holds the edges u -> v with rank[u] < rank[v] in CSR form, indexed
+    by u. down holds the edges u -> v with rank[u] > rank[v], indexed by v.
+
+    Examples:
+    ch = ContractionHierarchy.from_graph(sbahn)
+    ch.query('Vaihingen', 'Waiblingen')  # returns the cost and the path
+    ch.save('sbahn_ch.npz')
+    ch = ContractionHierarchy.load('sbahn_ch.npz')
+    """
+    def __init__(self, names, rank, up, down):
+        """
+        The constructor for a ContractionHierarchy. Usually you want to
+        use ContractionHierarchy.from_graph() or ContractionHierarchy.load().
+        :param names: A list with the name of each id
+        :param rank: A numpy array with the contraction order of each id
+        :param up: The upward edges as tuple of offsets, targets, weights
+                   and middles arrays (-1 for edges of the graph)
+        :param down: The downward edges in the same format
+        """
+        self.names = names
+        self.ids = dict((name, i) for i, name in enumerate(names))
+        self.rank = rank
+        self.up = up
+        self.down = down
+        # plain lists are much faster to index from python than arrays
+        self.rank_list = rank.tolist()
+        self.up_lists = [a.tolist() for a in up]
+        self.down_lists = [a.tolist() for a in down]
+        self.settled = 0
+
+    @classmethod
+    def from_graph(cls, graph, witness_limit=500):
+        """
+        Contracts all states of a graph. The next state to contract is the
+        one with the smallest edge difference (shortcuts added minus edges
+        removed) plus the number of already contracted neighbours.
+
+        :param graph: A CompactGraph or a nested dict
+        :param witness_limit: The maximum number of states settled by one
+                              witness search. A smaller limit makes the
+                              preprocessing faster, but adds more shortcuts
+        :return: A ContractionHierarchy
+        """
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_dict(graph)
+        n = len(graph)
+
+        out_edges = [{} for _ in range(n)]
+        in_edges = [{} for _ in range(n)]
+        for u in range(n):
+            for v, cost in graph.neighbours(u):
+                if u != v and cost < out_edges[u].get(v, (float('inf'),))[0]:
+                    out_edges[u][v] = (cost, -1)
+                    in_edges[v][u] = (cost, -1)
+
+        def shortcuts(v):
+            result = []
+            if not out_edges[v]:
+                return result
+            max_out = max(cost for cost, _ in out_edges[v].values())
+            for u, (in_cost, _) in in_edges[v].items():
+                witnesses = witness_search(out_edges, u, v, out_edges[v],
+                                           in_cost + max_out, witness_limit)
+                for w, (out_cost, _) in out_edges[v].items():
+                    if w == u:
+                        continue
+                    if witnesses.get(w, float('inf')) > in_cost + out_cost:
+                        result.append((u, w, in_cost + out_cost))
+            return result
+
+        contracted_neighbours = [0] * n
+
+        def priority(v, added):
+            return (len(added) - len(out_edges[v]) - len(in_edges[v]) +
+                    contracted_neighbours[v])
+
+        heap = [(priority(v, shortcuts(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.empty(n, dtype=np.int32)
+        up, down = [None] * n, [None] * n
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            added = shortcuts(v)
+            # lazy update: contract v only if it is still the best choice
+            if heap and priority(v, added) > heap[0][0]:
+                heapq.heappush(heap, (priority(v, added), v))
+                continue
+
+            for u, w, cost in added:
+                if cost < out_edges[u].get(w, (float('inf'),))[0]:
+                    out_edges[u][w] = (cost, v)
+                    in_edges[w][u] = (cost, v)
+            for u in in_edges[v]:
+                del out_edges[u][v]
+                contracted_neighbours[u] += 1
+            for w in out_edges[v]:
+                del in_edges[w][v]
+                contracted_neighbours[w] += 1
+
+            # all remaining neighbours are contracted later
+            up[v], down[v] = out_edges[v], in_edges[v]
+            rank[v] = order
+            order += 1
+
+        return cls(list(graph.names), rank, to_csr(up), to_csr(down))
+
+    def save(self, filename):
+        """
+        Writes the hierarchy into a single .npz file.
+        """
+        np.savez(filename, names=np.array(self.names), rank=self.rank,
+                 up_offsets=self.up[0], up_targets=self.up[1],
+                 up_weights=self.up[2], up_middles=self.up[3],
+                 down_offsets=self.down[0], down_targets=self.down[1],
+                 down_weights=self.down[2], down_middles=self.down[3])
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Loads a hierarchy written by save().
+        :return: A ContractionHierarchy
+        """
+        data = np.load(filename)
+        fields = ['offsets', 'targets', 'weights', 'middles']
+        up = tuple(data['up_' + field] for field in fields)
+        down = tuple(data['down_' + field] for field in fields)
+        return cls(data['names'].tolist(), data['rank'], up, down)
+
+    def index(self, state):
+        if state in self.ids:
+            return self.ids[state]
+        return state
+
+    def middle(self, u, v):
+        """
+        Returns the state skipped by the edge u -> v, -1 if it is an edge
+        of the original graph.
+        """
+        if self.rank_list[u] < self.rank_list[v]:
+            offsets, targets, _, middles = self.up_lists
+            source, target = u, v
+        else:
+            offsets, targets, _, middles = self.down_lists
+            source, target = v, u
+        for i in range(offsets[source], offsets[source + 1]):
+            if targets[i] == target:
+                return middles[i]
+        raise KeyError((u, v))
+
+    def unpack(self, path):
+        """
+        Replaces all shortcuts on a path of ids by the original edges.
+        """
+        result = [path[0]]
+        stack = list(reversed(zip(path, path[1:])))
+        while stack:
+            u, v = stack.pop()
+            middle = self.middle(u, v)
+            if middle < 0:
+                result.append(v)
+            else:
+                stack.append((middle, v))
+                stack.append((u, middle))
+        return result
+
+    def query(self, start, goal):
+        """
+        Computes the shortest path between two states. The number of
+        settled states is stored in self.settled.
+
+        :param start: A state name or id
+        :param goal: A state name or id
+        :return: a tuple with the cost as first entry (inf if the goal is
+                 not reachable) and a list of the state names from start
+                 to goal as second entry (None if not reachable)
+        """
+        start, goal = self.index(start), self.index(goal)
+        searches = [(self.up_lists, {start: 0}, {start: -1}, [(0, start)]),
+                    (self.down_lists, {goal: 0}, {goal: -1}, [(0, goal)])]
+        done = [set(), set()]
+        best, meeting = float('inf'), None
+
+        while True:
+            active = [side for side in (0, 1) if searches[side][3] and
+                      searches[side][3][0][0] < best]
+            if not active:
+                break
+            for side in active:
+                edges, distances, parents, heap = searches[side]
+                distance, u = heapq.heappop(heap)
+                if u in done[side]:
+                    continue
+                done[side].add(u)
+                other_distances = searches[1 - side][1]
+                if u in other_distances and \
+                        distance + other_distances[u] < best:
+                    best, meeting = distance + other_distances[u], u
+
+                offsets, targets, weights, _ = edges
+                for i in range(offsets[u], offsets[u + 1]):
+                    v, cost = targets[i], weights[i]
+                    if distance + cost < distances.get(v, float('inf')):
+                        distances[v] = distance + cost
+                        parents[v] = u
+                        heapq.heappush(heap, (distance + cost, v))
+        self.settled = len(done[0]) + len(done[1])
+
+        if meeting is None:
+            return float('inf'), None
+        path = []
+        u = meeting
+        while u != -1:
+            path.append(u)
+            u = searches[0][2][u]
+        path.reverse()
+        u = searches[1][2][meeting]
+        while u != -1:
+            path.append(u)
+            u = searches[1][2][u]
+        return best, [self.names[i] for i in self.unpack(path)]
+
+    def distance(self, start, goal):
+        return self.query(start, goal)[0]
+
+    def path(self, start, goal):
+        return self.query(start, goal)[1]
@@ -1,5 +1,9 @@
 from data import graph, sbahn, coordinates
-from Queue import Queue, LifoQueue, PriorityQueue
+from compact_graph import CompactGraph
+from search_stats import instrumented
+from Queue import Queue, LifoQueue
+import heapq
+import itertools
 
 
 class FailureException(Exception):
@@ -26,23 +30,54 @@ class UnvalidGoalException(Exception):
 class Node(object):
     """
     A very simple node data structure for Trees.
+
+    A node only references its parent, so nodes that are neither in a
+    fringe nor an ancestor of one can be freed during a search. __slots__
+    keeps each node small.
     """
+    __slots__ = ('state', 'parent', 'path_cost', 'depth')
+
     def __init__(self, state, parent, path_cost, depth):
         self.state = state
-
         self.parent = parent
-        self.children = []
         self.path_cost = path_cost
         self.depth = depth
 
-        if self.parent is not None:
-            self.parent.children.append(self)
+    def path(self):
+        """
+        Returns the states from the root of the tree to this node
+        """
+        states = []
+        node = self
+        while node is not None:
+            states.append(node.state)
+            node = node.parent
+        states.reverse()
+        return states
 
     def __str__(self):
-        string = "'" + self.state + "'"
-        if self.parent is not None:
-            string = string + ", " + str(self.parent)
-        return string
+        states = self.path()
+        states.reverse()
+        return ", ".join("'" + str(state) + "'" for state in states)
+
+
+class MemoryNode(Node):
+    """
+    A Node of the search tree that sma_star_search() keeps in memory.
+
+    Besides the Node fields it holds its f value, which is backed up from
+    its successors once it is expanded, the successors that are currently
+    in memory and a dict with the f values of the successors that were
+    forgotten to free memory (None if there are none).
+    """
+    __slots__ = ('f', 'children', 'forgotten', 'version')
+
+    def __init__(self, state, parent, path_cost, depth, f):
+        super(MemoryNode, self).__init__(state, parent, path_cost, depth)
+        self.f = f
+        self.children = []
+        self.forgotten = None
+        self.version = 0
 
 
 class NodePriorityQueue(object):
@@ -50,10 +85,22 @@ class NodePriorityQueue(object):
     A PriorityQueue that uses the path_cost as priority. When a heuristic and
     a goal state is given the heuristic cost from each node to the goal state
     is added to the priority.
+
+    The queue is a binary heap holding at most one live entry per state.
+    Putting a node for a state that is already queued with a higher
+    priority replaces the old entry (decrease-key), entries with equal
+    priority are returned in insertion order.
+
+    The heuristic cost to the nearest goal is computed only once per
+    state. If the heuristic is a HeuristicTable for the same goals, its
+    precomputed estimates are used directly.
     """
     def __init__(self, heuristic=None, goals=[None]):
-        self.visited = []
-        self.queue = PriorityQueue()
+        self.visited = set()
+        self.heap = []
+        self.entries = {}
+        self.skipped = 0
+        self.counter = itertools.count()
         self.goals = goals
 
         if heuristic is not None:
@@ -62,33 +109,66 @@ class NodePriorityQueue(object):
             # if no heuristic is given use a constant 0 heuristic
             self.heuristic = lambda u, v: 0
 
+        # a HeuristicTable is recognized by its estimate() and goals, so
+        # that this module does not need NumPy
+        if getattr(heuristic, 'estimate', None) is not None and \
+                hasattr(heuristic, 'goals'):
+            if set(heuristic.goals) != set(goals):
+                raise ValueError("The heuristic table is for other goals")
+            self.estimate = heuristic.estimate
+        elif heuristic is None:
+            self.estimate = lambda state: 0
+        else:
+            self.estimates = {}
+            self.estimate = self.memoized_estimate
+
+    def memoized_estimate(self, state):
+        """
+        Returns the heuristic cost from a state to the nearest goal and
+        remembers it for later calls.
+        """
+        estimate = self.estimates.get(state)
+        if estimate is None:
+            estimate = min(self.heuristic(state, goal) for goal in self.goals)
+            self.estimates[state] = estimate
+        return estimate
+
     def put(self, node):
         """
         This function puts a node with the correct priority into the
-        internal priority queue. You don't have to take care to adjust
-        earlier added nodes
+        internal priority queue. Nodes of already visited states are
+        dropped and an earlier added node of the same state is replaced
+        if the new node has a lower priority.
         """
-        if self.heuristic is not None:
-            nearest_goal = self.goals[0]
-            for goal in self.goals:
-                if self.heuristic(node.state, goal) < self.heuristic(node.state, nearest_goal):
-                    nearest_goal = goal
-            priority = node.path_cost + self.heuristic(node.state, nearest_goal)
-        else:
-            priority = node.path_cost
-        
-        self.queue.put((priority, node))
+        if node.state in self.visited:
+            self.skipped += 1
+            return
+
+        priority = node.path_cost + self.estimate(node.state)
+
+        entry = self.entries.get(node.state)
+        if entry is not None:
+            if entry[0] <= priority:
+                self.skipped += 1
+                return
+            # the old entry stays in the heap and is skipped when popped
+            entry[-1] = None
+
+        entry = [priority, next(self.counter), node]
+        self.entries[node.state] = entry
+        heapq.heappush(self.heap, entry)
 
     def get(self):
         """
         This function takes care that already visited nodes are not visited
         again.
         """
-        _, node = self.queue.get()
-        while node.state in self.visited:
-            _, node = self.queue.get()
+        if self.empty():
+            raise FailureException
 
-        self.visited.append(node.state)
+        _, _, node = heapq.heappop(self.heap)
+        del self.entries[node.state]
+        self.visited.add(node.state)
         return node
 
     def empty(self):
@@ -96,66 +176,236 @@ class NodePriorityQueue(object):
         empty() returns true if the queue is empty or has only already
         visited nodes in it.
         """
-        if self.queue.empty():
-            return True
-        priority, node = self.queue.get()
-        while node.state in self.visited:
-            if self.queue.empty():
-                return True
-            priority, node = self.queue.get()
+        while self.heap and self.heap[0][-1] is None:
+            heapq.heappop(self.heap)
+            self.skipped += 1
+        return not self.heap
 
-        self.queue.put((priority, node))
-        return False
+    def min_priority(self):
+        """
+        Returns the lowest priority in the queue or infinity if the queue
+        is empty.
+        """
+        if self.empty():
+            return float('inf')
+        return self.heap[0][0]
+
+    def __len__(self):
+        return len(self.entries)
 
 
-def expand(node, graph):
+class MemoryBoundedQueue(object):
+    """
+    The fringe of sma_star_search(). It holds the leaves of the search tree
+    and the nodes with forgotten successors, which have to be expanded
+    again to regenerate them.
+
+    get() returns the node with the lowest priority, on ties goals first
+    and then the deepest node. pop_worst() returns the leaf with the
+    highest priority, the shallowest one on ties, which is the one to
+    forget when memory runs out. Both heaps are updated lazily, like in
+    NodePriorityQueue, and the outdated entries are dropped once a heap
+    holds more than 8 entries per node, so that their size is bounded by
+    the number of nodes and not by the number of expansions.
+    """
+    def __init__(self, goals=()):
+        self.goals = goals
+        self.nodes = set()
+        self.best = []
+        self.worst = []
+        self.skipped = 0
+        self.counter = itertools.count()
+
+    def priority(self, node):
+        """
+        Nodes with forgotten successors are ordered by the lowest f value
+        of them, the other leaves by their own f value.
+        """
+        if node.forgotten:
+            return min(node.forgotten.itervalues())
+        return node.f
+
+    def put(self, node):
+        """
+        Puts a MemoryNode into the queue or updates its priority
+        """
+        node.version += 1
+        self.nodes.add(node)
+        priority = self.priority(node)
+        count = next(self.counter)
+        heapq.heappush(self.best, (priority, node.state not in self.goals,
+                                   -node.depth, count, node.version, node))
+        if not node.children:
+            heapq.heappush(self.worst, (-priority, node.depth, count,
+                                        node.version, node))
+        if max(len(self.best), len(self.worst)) > 8 * len(self.nodes) + 64:
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Rebuilds both heaps from the valid entries, which drops the
+        outdated ones
+        """
+        best = [entry for entry in self.best if self.valid(entry)]
+        worst = [entry for entry in self.worst
+                 if self.valid(entry) and not entry[-1].children]
+        self.skipped += len(self.best) - len(best)
+        self.skipped += len(self.worst) - len(worst)
+        heapq.heapify(best)
+        heapq.heapify(worst)
+        self.best, self.worst = best, worst
+
+    def valid(self, entry):
+        node = entry[-1]
+        return node in self.nodes and node.version == entry[-2]
+
+    def get(self):
+        """
+        Removes and returns the node with the lowest priority together with
+        the priority.
+        """
+        if self.empty():
+            raise FailureException
+        entry = heapq.heappop(self.best)
+        self.nodes.remove(entry[-1])
+        return entry[-1], entry[0]
+
+    def pop_worst(self):
+        """
+        Removes and returns the leaf with the highest priority or None if
+        there is no leaf.
+        """
+        while self.worst:
+            entry = heapq.heappop(self.worst)
+            if self.valid(entry) and not entry[-1].children:
+                self.nodes.remove(entry[-1])
+                return entry[-1], -entry[0]
+            self.skipped += 1
+        return None, None
+
+    def empty(self):
+        while self.best and not self.valid(self.best[0]):
+            heapq.heappop(self.best)
+            self.skipped += 1
+        return not self.best
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def neighbours(graph, state):
+    """
+    Returns the neighbours of a state together with the edge costs
+
+    :param graph: The graph, either a nested dict, a CompactGraph or a
+                  successor function, which gets a state and returns or
+                  yields its (neighbour, cost) tuples. With a successor
+                  function the graph is never built, the states only
+                  have to be hashable
+    :param state: The state whose neighbours are returned
+    :return: An iterable of (neighbour, cost) tuples
+    """
+    if isinstance(graph, CompactGraph):
+        return graph.neighbours(state)
+    if callable(graph):
+        return graph(state)
+    return graph[state].iteritems()
+
+
+def generate_successors(node, graph, skip=None):
+    """
+    Generates the successors of a node one by one
+
+    :param graph: The graph, that defines the problem
+    :param skip: An optional set of states for which no successor
+                 is generated
+    :return: A generator of successor Nodes
+    """
+    for neighbour, cost in neighbours(graph, node.state):
+        if skip is not None and neighbour in skip:
+            continue
+        yield Node(neighbour, node, node.path_cost + cost, node.depth + 1)
+
+
+def expand(node, graph, skip=None):
     """
     Expands a node in a given graph
     
     :param graph: The graph, that defines the problem
+    :param skip: An optional set of states for which no successor
+                 is generated
     :return: A list of all successors
     """
-    successors = []
-    
-    for neighbour in graph[node.state]:
-        n = Node(neighbour, node, node.path_cost + graph[node.state][neighbour], node.depth + 1)
-        successors.append(n)
-    
-    return successors
+    return list(generate_successors(node, graph, skip))
+
+
+def prepare(graph, start, goals):
+    """
+    Brings start and goals into the form the searches work on. For a
+    CompactGraph state names are translated to ids.
+
+    :param graph: The graph, either a nested dict, a CompactGraph or a
+                  successor function, see neighbours()
+    :param start: The start state or a Node
+    :param goals: A list of goal states
+    :return: A tuple of the start Node and the list of goals
+    """
+    # the states of a successor function are not known in advance
+    if not callable(graph):
+        for goal in goals:
+            if goal not in graph:
+                raise UnvalidGoalException
+
+    if isinstance(graph, CompactGraph):
+        goals = [graph.index(goal) for goal in goals]
+        if type(start) is not Node:
+            start = graph.index(start)
+
+    if type(start) is not Node:
+        start = Node(start, None, 0, 0)
+    return start, goals
  
 
-def breadth_first_search(graph, start, goals):
+@instrumented
+def breadth_first_search(graph, start, goals, graph_search=False, stats=None):
     """
     TreeSearch that searchs by looking for the goal in the breadth first
 
     :param graph: The graph to run the BFS on
     :param start: The start node
     :param goals: A list of nodes that should be reached (one of them)
+    :param graph_search: If True, states that were already explored or
+                         are in the fringe are not added again
+    :param stats: An optional search_stats.SearchStats that is filled in
     :return: a tuple with a the found node as first entry and the
             fringe as the second entry
     """
-    for goal in goals:
-        if goal not in graph:
-            raise UnvalidGoalException
-    
-    if type(start) is not Node:
-        start = Node(start, None, 0, 0)
+    start, goals = prepare(graph, start, goals)
         
     fringe = Queue()
     fringe.put(start)
     for goal in goals:
             if goal == start.state: return (start, fringe)
+
+    # explored states and states in the fringe, only used in graph search
+    reached = set([start.state]) if graph_search else None
+    if stats is not None: stats.phase('search')
        
     while True:
-        if fringe is None: raise FailureException
+        if fringe.empty(): raise FailureException
         node = fringe.get()
         for goal in goals:
             if goal == node.state: return node, fringe
-        for successor in expand(node, graph):
+        successors = expand(node, graph, reached)
+        for successor in successors:
+            if graph_search:
+                reached.add(successor.state)
             fringe.put(successor)
+        if stats is not None: stats.expand(len(successors), fringe.qsize())
                            
                 
-def uniform_cost_search(graph, start, goals):
+@instrumented
+def uniform_cost_search(graph, start, goals, graph_search=False, stats=None):
     """
     TreeSearch that searchs by looking for the goal in the breadth with
     the minimum path cost first
@@ -163,85 +413,206 @@ def uniform_cost_search(graph, start, goals):
     :param graph: The graph to run the BFS on
     :param start: The start node
     :param goals: A list of nodes that should be reached (one of them)
+    :param graph_search: If True, no successors are generated for
+                         already explored states
+    :param stats: An optional search_stats.SearchStats that is filled in
     :return: a tuple with a the found node as first entry and the
             fringe as the second entry
     """
-    for goal in goals:
-        if goal not in graph:
-            raise UnvalidGoalException
-    
-    if type(start) is not Node:
-        start = Node(start, None, 0, 0)
+    start, goals = prepare(graph, start, goals)
         
     fringe = NodePriorityQueue()
     fringe.put(start)
+    if stats is not None:
+        stats.watch(fringe)
+        stats.phase('search')
        
     while True:
-        if fringe is None: raise FailureException
+        if fringe.empty(): raise FailureException
         node = fringe.get()
         for goal in goals:
             if goal == node.state: return node, fringe
-        for successor in expand(node, graph):
+        explored = fringe.visited if graph_search else None
+        successors = expand(node, graph, explored)
+        for successor in successors:
             fringe.put(successor)
+        if stats is not None: stats.expand(len(successors), len(fringe))
             
         
-def depth_limited_search(graph, start, goals, limit):
+@instrumented
+def depth_limited_search(graph, start, goals, limit, graph_search=False,
+                         stats=None):
     """
-    Recursive depth-limited-search.
+    Depth-limited-search, see depth_limited_stack_search().
     Raises a CutoffException if the goal could not by found due to the limit
 
     :param graph: The graph to run the DFS on
     :param start: The start node
     :param goals: A list of nodes that should be reached (one of them)
     :param limit: The depth limit
+    :param graph_search: If True, a state is only expanded again if it
+                         is reached at a lower depth than before
+    :param stats: An optional search_stats.SearchStats that is filled in
     :return: the found node
     """
-    for goal in goals:
-        if goal not in graph:
-            raise UnvalidGoalException
-    
-    if type(start) is not Node:
-        start = Node(start, None, 0, 0)
-    node = start
-        
-    for goal in goals:
-        if goal == node.state: return node
-    if node.depth == limit:
-        raise CutoffException
-    else: 
-        for successor in expand(node, graph):
-            try:
-                result = depth_limited_search(graph, successor, goals, limit)
-                return result
-            except(CutoffException):
-                cutoff = True
-        if cutoff: raise CutoffException
+    start, goals = prepare(graph, start, goals)
+    explored = {} if graph_search else None
+    if stats is not None: stats.phase('search')
+    node, cutoff = depth_limited_stack_search(graph, start, set(goals), limit,
+                                              explored, stats=stats)
+    if node is not None: return node
+    if cutoff: raise CutoffException
+    raise FailureException
+
+
+def depth_limited_stack_search(graph, start, goals, limit, explored=None,
+                               boundary=None, max_boundary=None, stats=None):
+    """
+    Depth-limited-search with an explicit stack instead of recursion.
+    The nodes are visited in the same order as a recursive search would
+    visit them.
+
+    :param graph: The graph to run the DFS on
+    :param start: The start Node
+    :param goals: A set of states that should be reached (one of them)
+    :param limit: The depth limit
+    :param explored: None for a tree search, otherwise a dict that maps
+                     each expanded state to a tuple of the lowest depth
+                     it was expanded at and whether a cutoff occured
+                     below it (None while it is still searched)
+    :param boundary: An optional list the nodes that were cut off at
+                     the limit are appended to
+    :param max_boundary: If given, at most max_boundary + 1 nodes are
+                         appended to boundary
+    :param stats: An optional search_stats.SearchStats that is updated
+    :return: a tuple with the found node (None if no goal was found) as
+             first entry and whether a cutoff occured as second entry
+    """
+    if start.state in goals: return start, False
+    if start.depth == limit:
+        if boundary is not None:
+            boundary.append(start)
+        return None, True
+    if explored is not None:
+        explored[start.state] = (start.depth, None)
+
+    # each frame holds a node, a generator of its successors and
+    # whether a cutoff occured below the node. The successors are only
+    # generated when they are visited
+    root = [start, generate_successors(start, graph), False]
+    stack = [root]
+    if stats is not None: stats.expand(0, len(stack))
+    while stack:
+        frame = stack[-1]
+        node = next(frame[1], None)
+
+        if node is None:
+            stack.pop()
+            if explored is not None:
+                explored[frame[0].state] = (frame[0].depth, frame[2])
+            if stack and frame[2]:
+                stack[-1][2] = True
+            continue
+
+        if stats is not None: stats.generated += 1
+        if node.state in goals: return node, False
+        if node.depth == limit:
+            frame[2] = True
+            if boundary is not None and (max_boundary is None or
+                                         len(boundary) <= max_boundary):
+                boundary.append(node)
+            continue
+        if explored is not None:
+            if node.state in explored and explored[node.state][0] <= node.depth:
+                # everything below was or is searched with a larger budget
+                if explored[node.state][1]:
+                    frame[2] = True
+                if stats is not None: stats.skipped += 1
+                continue
+            explored[node.state] = (node.depth, None)
+
+        stack.append([node, generate_successors(node, graph), False])
+        if stats is not None: stats.expand(0, len(stack))
+
+    return None, root[2]
             
     
-def iterative_deepening_search(graph, start, goals):
+@instrumented
+def iterative_deepening_search(graph, start, goals, graph_search=False,
+                               max_boundary=10000, stats=None):
     """
-    Recursive depth-limited-search with increasing limit
+    Depth-limited-search with increasing limit
+
+    As long as the nodes cut off at the last limit (the boundary) are not
+    more than max_boundary, the next iteration only expands the boundary
+    by one level instead of searching again from the start. The result
+    is the same, since the nodes of the boundary are kept in the order a
+    depth-limited search visits them.
 
     :param graph: The graph to run the DFS on
     :param start: The start node
     :param goals: A list of nodes that should be reached (one of them)
+    :param graph_search: If True, states are not expanded twice within
+                         one iteration
+    :param max_boundary: The maximum number of nodes kept between two
+                         iterations, 0 to always search from the start
+    :param stats: An optional search_stats.SearchStats that is filled in
     :return: the found node
     """
-    for goal in goals:
-        if goal not in graph:
-            raise UnvalidGoalException
-    
+    start, goals = prepare(graph, start, goals)
+    goals = set(goals)
+
+    frontier, reached = None, None
     limit = 0
     while True:
-        try:
-            limit = limit + 1
-            node = depth_limited_search(graph, start, goals, limit)
-            return node
-        except(CutoffException):
-            pass
+        limit = limit + 1
+        if stats is not None: stats.iterations += 1
+        if frontier is None:
+            if stats is not None: stats.phase('search')
+            explored = {} if graph_search else None
+            boundary = []
+            node, cutoff = depth_limited_stack_search(graph, start, goals,
+                                                      limit, explored,
+                                                      boundary, max_boundary,
+                                                      stats)
+            if node is not None: return node
+            if not cutoff: raise FailureException
+            if len(boundary) > max_boundary:
+                continue
+            if graph_search:
+                # keep only the first node of each state not expanded yet
+                reached = set(explored)
+                frontier = []
+                for node in boundary:
+                    if node.state not in reached:
+                        reached.add(node.state)
+                        frontier.append(node)
+            else:
+                frontier = boundary
+        else:
+            if stats is not None: stats.phase('boundary')
+            boundary = []
+            for node in frontier:
+                successors = expand(node, graph, reached)
+                if stats is not None:
+                    stats.expand(len(successors),
+                                 len(frontier) + len(boundary) +
+                                 len(successors))
+                for successor in successors:
+                    if successor.state in goals: return successor
+                    if reached is not None:
+                        reached.add(successor.state)
+                    boundary.append(successor)
+            if not boundary: raise FailureException
+            frontier = boundary
+
+            if len(frontier) > max_boundary:
+                frontier, reached = None, None
 
 
-def a_star_search(graph, start, goals, heuristic):
+@instrumented
+def a_star_search(graph, start, goals, heuristic, graph_search=False,
+                  stats=None):
     """
     A-star-search which looks for nodes with minimum path cost and
     minimum heuristic value
@@ -251,16 +622,17 @@ def a_star_search(graph, start, goals, heuristic):
     :param goals: A list of nodes that should be reached (one of them)
     :param heuristic: A function that returns a heuristic cost value
                       for two given nodes. E.g. heuristic('A', 'B')
-                      returns a float
+                      returns a float. On a CompactGraph it is
+                      called with ids instead of names. A
+                      HeuristicTable for the goals can be used
+                      to avoid computing it during the search
+    :param graph_search: If True, no successors are generated for
+                         already explored states
+    :param stats: An optional search_stats.SearchStats that is filled in
     :return: a tuple with the found node as first entry and the
             fringe as the second entry
     """
-    for goal in goals:
-        if goal not in graph:
-            raise UnvalidGoalException
-    
-    if type(start) is not Node:
-        start = Node(start, None, 0, 0)
+    start, goals = prepare(graph, start, goals)
         
     fringe = NodePriorityQueue(heuristic, goals)
     fringe.put(start)
@@ -269,15 +641,352 @@ def a_star_search(graph, start, goals, heuristic):
     for goal in goals:
         if heuristic(start.state, goal) < heuristic(start.state, nearest_goal):
             nearest_goal = goal
+    if stats is not None:
+        stats.watch(fringe)
+        stats.phase('search')
 
     while True:
-        if fringe is None: raise FailureException
+        if fringe.empty(): raise FailureException
         node = fringe.get()
-        if nearest_goal is node.state: return node, fringe
-        for successor in expand(node, graph):
+        if nearest_goal == node.state: return node, fringe
+        explored = fringe.visited if graph_search else None
+        successors = expand(node, graph, explored)
+        for successor in successors:
             fringe.put(successor)
-            
-            
+        if stats is not None: stats.expand(len(successors), len(fringe))
+
+
+def cost_limited_stack_search(graph, start, goals, bound, estimate,
+                              stats=None):
+    """
+    Depth-first search that cuts off every node whose path cost plus
+    heuristic cost exceeds the bound. States on the current path are not
+    visited again, otherwise the search does not keep any state.
+
+    :param graph: The graph to run the DFS on
+    :param start: The start Node
+    :param goals: A set of states that should be reached (one of them)
+    :param bound: The cost bound
+    :param estimate: A function that returns the heuristic cost from a
+                     state to the nearest goal
+    :param stats: An optional search_stats.SearchStats that is updated
+    :return: a tuple with the found node (None if no goal was found) as
+             first entry and the lowest cost above the bound as second
+             entry (infinity if nothing was cut off)
+    """
+    next_bound = float('inf')
+    f = start.path_cost + estimate(start.state)
+    if f > bound: return None, f
+    if start.state in goals: return start, bound
+
+    stack = [[start, generate_successors(start, graph)]]
+    on_path = set([start.state])
+    if stats is not None: stats.expand(0, len(stack))
+    while stack:
+        frame = stack[-1]
+        node = next(frame[1], None)
+
+        if node is None:
+            stack.pop()
+            on_path.discard(frame[0].state)
+            continue
+
+        if stats is not None: stats.generated += 1
+        if node.state in on_path:
+            if stats is not None: stats.skipped += 1
+            continue
+        f = node.path_cost + estimate(node.state)
+        if f > bound:
+            next_bound = min(next_bound, f)
+            continue
+        if node.state in goals: return node, bound
+
+        stack.append([node, generate_successors(node, graph)])
+        on_path.add(node.state)
+        if stats is not None: stats.expand(0, len(stack))
+
+    return None, next_bound
+
+
+@instrumented
+def ida_star_search(graph, start, goals, heuristic, stats=None):
+    """
+    Iterative deepening A-star-search, which repeats a depth-first search
+    bounded by path cost plus heuristic cost. Each iteration raises the
+    bound to the lowest cost that was cut off before. The memory needed
+    only grows with the depth of the solution, but nodes are expanded
+    again in every iteration.
+
+    :param graph: The graph to run the search on
+    :param start: The start node
+    :param goals: A list of nodes that should be reached (one of them)
+    :param heuristic: An admissible heuristic like in a_star_search()
+    :param stats: An optional search_stats.SearchStats that is filled in
+    :return: the found node
+    """
+    start, goals = prepare(graph, start, goals)
+    # the queue is only used for its heuristic estimates
+    estimate = NodePriorityQueue(heuristic, goals).estimate
+    goals = set(goals)
+
+    bound = start.path_cost + estimate(start.state)
+    while True:
+        if stats is not None:
+            stats.iterations += 1
+            stats.phase('search')
+        node, bound = cost_limited_stack_search(graph, start, goals, bound,
+                                                estimate, stats)
+        if node is not None: return node
+        if bound == float('inf'): raise FailureException
+
+
+@instrumented
+def sma_star_search(graph, start, goals, heuristic, max_nodes=10000,
+                    stats=None):
+    """
+    Simplified memory-bounded A-star-search. It works like an A-star tree
+    search until max_nodes nodes are in memory. Then the leaf with the
+    highest f value is forgotten and its f value is kept in the parent,
+    which is expanded again when the forgotten subtree becomes the best
+    choice.
+
+    The result is optimal if max_nodes is large enough to hold the path
+    to the nearest goal. A CutoffException is raised if no goal was found
+    because a path did not fit into memory.
+
+    :param graph: The graph to run the search on
+    :param start: The start node
+    :param goals: A list of nodes that should be reached (one of them)
+    :param heuristic: An admissible heuristic like in a_star_search()
+    :param max_nodes: The maximum number of nodes kept in memory
+    :param stats: An optional search_stats.SearchStats that is filled in
+    :return: a tuple with the found node as first entry and the
+            fringe as the second entry
+    """
+    if max_nodes < 1:
+        raise ValueError("max_nodes has to be at least 1")
+    start, goals = prepare(graph, start, goals)
+    estimate = NodePriorityQueue(heuristic, goals).estimate
+    goals = set(goals)
+
+    root = MemoryNode(start.state, start.parent, start.path_cost, start.depth,
+                      start.path_cost + estimate(start.state))
+    fringe = MemoryBoundedQueue(goals)
+    fringe.put(root)
+    size = 1
+    cutoff = False
+    if stats is not None:
+        stats.watch(fringe)
+        stats.phase('search')
+
+    while True:
+        node, priority = fringe.get()
+        if priority == float('inf'):
+            if cutoff: raise CutoffException
+            raise FailureException
+        if node.state in goals: return node, fringe
+
+        # a node is expanded once, later only its best forgotten
+        # successors are regenerated with the f values they had
+        regenerate = None
+        if node.forgotten:
+            regenerate = set(state for state, f in node.forgotten.iteritems()
+                             if f == priority)
+            for state in regenerate:
+                del node.forgotten[state]
+        else:
+            on_path = set(node.path())
+        successors = []
+        for neighbour, cost in neighbours(graph, node.state):
+            if regenerate is not None:
+                if neighbour not in regenerate:
+                    continue
+            elif neighbour in on_path:
+                continue
+            # a path to a node at depth d needs d + 1 nodes of memory
+            depth = node.depth + 1 - root.depth
+            if depth >= max_nodes:
+                cutoff = True
+                continue
+            path_cost = node.path_cost + cost
+            f = max(priority, path_cost + estimate(neighbour))
+            if depth == max_nodes - 1 and neighbour not in goals:
+                # the node fits into memory, but none of its successors
+                cutoff = True
+                f = float('inf')
+            successors.append(MemoryNode(neighbour, node, path_cost,
+                                         node.depth + 1, f))
+
+        node.children.extend(successors)
+        size += len(successors)
+        for successor in successors:
+            fringe.put(successor)
+
+        # back up the lowest f value of the successors to the ancestors
+        ancestor = node
+        while True:
+            values = [child.f for child in ancestor.children]
+            if ancestor.forgotten:
+                values.extend(ancestor.forgotten.itervalues())
+            f = min(values) if values else float('inf')
+            if f <= ancestor.f:
+                break
+            ancestor.f = f
+            if ancestor is root:
+                break
+            ancestor = ancestor.parent
+        if node.forgotten or not node.children:
+            fringe.put(node)
+
+        # forget the worst leaves, but never the best new successor
+        keep = min(successors, key=lambda n: n.f) if successors else None
+        while size > max_nodes:
+            leaf, f = fringe.pop_worst()
+            if leaf is keep:
+                leaf, f = fringe.pop_worst()
+                fringe.put(keep)
+            if leaf is None:
+                break
+            parent = leaf.parent
+            parent.children.remove(leaf)
+            if parent.forgotten is None:
+                parent.forgotten = {}
+            parent.forgotten[leaf.state] = f
+            size -= 1
+            fringe.put(parent)
+        if stats is not None: stats.expand(len(successors), len(fringe))
+
+
+@instrumented
+def bidirectional_search(graph, start, goals, heuristic=None,
+                         reverse_graph=None, stats=None):
+    """
+    Searches from the start and from the goals at the same time, always
+    expanding the side with the smaller fringe. Whenever an edge connects
+    a state that was reached from both sides, the cost of the connecting
+    path is compared with the best one found so far. The search stops as
+    soon as the fringes cannot contain a cheaper connection.
+
+    Without a heuristic this is a bidirectional uniform cost search. With
+    a heuristic it must be consistent and symmetric, i.e. heuristic(u, v)
+    equals heuristic(v, u), because the backward search uses it towards
+    the start.
+
+    :param graph: The graph to run the search on
+    :param start: The start node
+    :param goals: A list of nodes that should be reached (one of them)
+    :param heuristic: None or a function like in a_star_search()
+    :param reverse_graph: The graph with all edges reversed. If None, the
+                          graph is assumed to be undirected, like sbahn
+    :param stats: An optional search_stats.SearchStats that is filled in
+    :return: a tuple with the found node as first entry and the fringe
+             of the forward search as the second entry
+    """
+    start, goals = prepare(graph, start, goals)
+    if reverse_graph is None:
+        reverse_graph = graph
+
+    forward = NodePriorityQueue(heuristic, goals)
+    backward = NodePriorityQueue(heuristic, [start.state])
+    # the cheapest node found so far for each state, from either side
+    forward_nodes = {start.state: start}
+    backward_nodes = {}
+    forward.put(start)
+    for goal in goals:
+        if goal not in backward_nodes:
+            backward_nodes[goal] = Node(goal, None, 0, 0)
+            backward.put(backward_nodes[goal])
+
+    best_cost, meeting = float('inf'), None
+    if start.state in backward_nodes:
+        best_cost, meeting = 0, (start, backward_nodes[start.state])
+    if stats is not None:
+        stats.watch(forward)
+        stats.watch(backward)
+        stats.phase('search')
+
+    while True:
+        forward_min, backward_min = forward.min_priority(), backward.min_priority()
+        if heuristic is None:
+            if forward_min + backward_min >= best_cost: break
+        elif max(forward_min, backward_min) >= best_cost: break
+
+        if len(forward) <= len(backward):
+            fringe, side_graph = forward, graph
+            nodes, other_nodes = forward_nodes, backward_nodes
+        else:
+            fringe, side_graph = backward, reverse_graph
+            nodes, other_nodes = backward_nodes, forward_nodes
+
+        node = fringe.get()
+        successors = expand(node, side_graph, fringe.visited)
+        if stats is not None:
+            stats.expand(len(successors),
+                         len(forward) + len(backward) + len(successors))
+        for successor in successors:
+            known = nodes.get(successor.state)
+            if known is None or successor.path_cost < known.path_cost:
+                nodes[successor.state] = successor
+                fringe.put(successor)
+            other = other_nodes.get(successor.state)
+            if other is not None and \
+                    successor.path_cost + other.path_cost < best_cost:
+                best_cost = successor.path_cost + other.path_cost
+                if fringe is forward:
+                    meeting = (successor, other)
+                else:
+                    meeting = (other, successor)
+
+    if stats is not None: stats.phase('unpack')
+    if meeting is None: raise FailureException
+
+    # append the backward half of the path to the forward node
+    node, backward_node = meeting
+    while backward_node.parent is not None:
+        cost = backward_node.path_cost - backward_node.parent.path_cost
+        backward_node = backward_node.parent
+        node = Node(backward_node.state, node, node.path_cost + cost,
+                    node.depth + 1)
+    return node, forward
+
+
+def bidirectional_uniform_cost_search(graph, start, goals,
+                                      reverse_graph=None, stats=None):
+    """
+    Uniform cost search from the start and the goals at the same time,
+    see bidirectional_search()
+
+    :param graph: The graph to run the search on
+    :param start: The start node
+    :param goals: A list of nodes that should be reached (one of them)
+    :param reverse_graph: The graph with all edges reversed, None for
+                          undirected graphs
+    :param stats: An optional search_stats.SearchStats that is filled in
+    :return: a tuple with the found node as first entry and the fringe
+             of the forward search as the second entry
+    """
+    return bidirectional_search(graph, start, goals, None, reverse_graph,
+                                stats=stats)
+
+
+def bidirectional_a_star_search(graph, start, goals, heuristic,
+                                reverse_graph=None, stats=None):
+    """
+    A-star-search from the start and the goals at the same time, see
+    bidirectional_search()
+
+    :param graph: The graph to run the search on
+    :param start: The start node
+    :param goals: A list of nodes that should be reached (one of them)
+    :param heuristic: A consistent and symmetric heuristic function
+    :param reverse_graph: The graph with all edges reversed, None for
+                          undirected graphs
+    :param stats: An optional search_stats.SearchStats that is filled in
+    :return: a tuple with the found node as first entry and the fringe
+             of the forward search as the second entry
+    """
+    return bidirectional_search(graph, start, goals, heuristic,
+                                reverse_graph, stats=stats)
 
   
 if __name__ == '__main__':
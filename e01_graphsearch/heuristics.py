@@ -0,0 +1,232 @@
+import numpy as np
+from compact_graph import CompactGraph
+from shortest_paths import dijkstra
+
+
+def euclidean(points, goal):
+    """
+    The straight line distance from each point to the goal.
+    :param points: A numpy array with shape (n, 2)
+    :param goal: A numpy array with shape (2,)
+    :return: A numpy array with shape (n,)
+    """
+    return np.sqrt(((points - goal) ** 2).sum(axis=1))
+
+
+def coordinate_array(coordinates, states):
+    """
+    Parses the coordinates of the given states into a numpy array.
+    :param coordinates: A dict like `coordinates` in data.py, mapping a
+                        state name to a pair of numbers or number strings
+    :param states: A list of state names, which gives the row order
+    :return: A float numpy array with shape (len(states), 2)
+    """
+    points = np.empty((len(states), 2))
+    for i, state in enumerate(states):
+        points[i] = [float(c) for c in coordinates[state]]
+    return points
+
+
+class HeuristicTable(object):
+    """
+    Heuristic values for a fixed list of goals, computed once upfront.
+
+    table[i, j] is the heuristic cost from the i-th state to the j-th goal
+    and estimates holds the minimum over all goals for each state. A
+    HeuristicTable can be passed as heuristic to a_star_search(), which
+    then does a single lookup per node instead of calling the heuristic
+    for every goal.
+
+    Examples:
+    h = HeuristicTable.from_coordinates(sbahn, coordinates, ['Vaihingen'])
+    h.estimate('Hauptbahnhof')  # the cost estimate to the nearest goal
+    h('Hauptbahnhof', 'Vaihingen')  # the cost estimate to one goal
+    """
+    def __init__(self, states, goals, table):
+        """
+        The constructor for a HeuristicTable.
+        :param states: A list of all states, which gives the row order
+        :param goals: A list of goal states, which gives the column order
+        :param table: A numpy array with shape (len(states), len(goals))
+        """
+        self.states = states
+        self.goals = goals
+        self.table = table
+        self.rows = dict((state, i) for i, state in enumerate(states))
+        self.columns = dict((goal, j) for j, goal in enumerate(goals))
+
+        estimates = table.min(axis=1).tolist()
+        if states == range(len(states)):
+            # the states are the ids of a CompactGraph
+            self.estimates = estimates
+        else:
+            self.estimates = dict(zip(states, estimates))
+
+    @classmethod
+    def from_coordinates(cls, graph, coordinates, goals, distance=euclidean):
+        """
+        Builds the table from coordinates with a vectorized distance.
+        :param graph: A nested dict or a CompactGraph
+        :param coordinates: A dict mapping each state name to its
+                            coordinates, e.g. `coordinates` in data.py,
+                            or for a CompactGraph a numpy array with
+                            the coordinates of each id, see
+                            loader.read_coordinates()
+        :param goals: A list of goal state names
+        :param distance: A function that gets a (n, 2) array of points and
+                         a goal point and returns the n heuristic costs
+        :return: A HeuristicTable
+        """
+        if isinstance(graph, CompactGraph):
+            names = graph.names
+            states = range(len(names))
+            goal_states = [graph.index(goal) for goal in goals]
+        else:
+            names = states = list(graph)
+            goal_states = list(goals)
+
+        if isinstance(coordinates, np.ndarray):
+            points = coordinates
+            goal_points = points[goal_states]
+        else:
+            points = coordinate_array(coordinates, names)
+            goal_points = coordinate_array(coordinates, goals)
+        table = np.column_stack([distance(points, goal_point)
+                                 for goal_point in goal_points])
+        return cls(states, goal_states, table)
+
+    @classmethod
+    def from_function(cls, heuristic, states, goals):
+        """
+        Tabulates an arbitrary heuristic function.
+        :param heuristic: A function like the heuristic of a_star_search()
+        :param states: A list of all states
+        :param goals: A list of goal states
+        :return: A HeuristicTable
+        """
+        table = np.array([[heuristic(state, goal) for goal in goals]
+                          for state in states])
+        return cls(list(states), list(goals), table.reshape(len(states),
+                                                            len(goals)))
+
+    def estimate(self, state):
+        """
+        Returns the heuristic cost from a state to the nearest goal.
+        """
+        return self.estimates[state]
+
+    def __call__(self, state, goal):
+        return self.table[self.rows[state], self.columns[goal]].item()
+
+
+class LandmarkHeuristic(object):
+    """
+    The ALT heuristic (A*, landmarks and triangle inequality).
+
+    For a few landmark states the shortest path costs from and to every
+    other state are computed once. By the triangle inequality
+    cost(u, v) >= cost(u, l) - cost(v, l) and
+    cost(u, v) >= cost(l, v) - cost(l, u) for every landmark l, so the
+    maximum of these bounds is an admissible and consistent heuristic.
+
+    Examples:
+    h = LandmarkHeuristic.from_graph(sbahn, 8)
+    a_star_search(sbahn, 'Vaihingen', ['Waiblingen'], h)
+    a_star_search(sbahn, 'Vaihingen', ['Waiblingen'], h.table(['Waiblingen']))
+    """
+    def __init__(self, names, landmarks, from_landmarks, to_landmarks,
+                 compact=True):
+        """
+        The constructor for a LandmarkHeuristic. Usually you want to use
+        LandmarkHeuristic.from_graph().
+        :param names: A list with the name of each id
+        :param landmarks: A list with the ids of the landmarks
+        :param from_landmarks: A numpy array with shape (n, k), the cost
+                               from each landmark to each state
+        :param to_landmarks: A numpy array with shape (n, k), the cost from
+                             each state to each landmark
+        :param compact: True if the heuristic is called with ids, False if
+                        it is called with names
+        """
+        self.names = names
+        self.ids = dict((name, i) for i, name in enumerate(names))
+        self.landmarks = landmarks
+        self.from_landmarks = from_landmarks
+        self.to_landmarks = to_landmarks
+        self.compact = compact
+
+    @classmethod
+    def from_graph(cls, graph, k=8, reverse_graph=None):
+        """
+        Selects k landmarks and computes their shortest path costs. The
+        first landmark is the state farthest from state 0, each further
+        one the state farthest from all landmarks selected so far.
+
+        :param graph: A CompactGraph or a nested dict
+        :param k: The number of landmarks
+        :param reverse_graph: The graph with all edges reversed, in the
+                              same form as graph. If None, the graph is
+                              assumed to be undirected, like sbahn
+        :return: A LandmarkHeuristic, which is called with ids for a
+                 CompactGraph and with names for a nested dict
+        """
+        compact = isinstance(graph, CompactGraph)
+        if not compact:
+            graph = CompactGraph.from_dict(graph)
+            if reverse_graph is not None:
+                reverse_graph = CompactGraph.from_dict(reverse_graph)
+        if reverse_graph is not None:
+            # the ids of both graphs have to match
+            order = [reverse_graph.index(name) for name in graph.names]
+
+        landmarks, from_landmarks, to_landmarks = [], [], []
+        # the cost from the nearest landmark, unreachable states are ignored
+        covered, _ = dijkstra(graph, 0, True)
+        for i in range(min(k, len(graph))):
+            landmark = int(np.argmax(np.where(np.isfinite(covered), covered,
+                                              -1)))
+            landmarks.append(landmark)
+            distances, _ = dijkstra(graph, landmark, True)
+            from_landmarks.append(distances)
+            if reverse_graph is None:
+                to_landmarks.append(distances)
+            else:
+                reverse_distances, _ = dijkstra(reverse_graph,
+                                                order[landmark], True)
+                to_landmarks.append(reverse_distances[order])
+            covered = distances if i == 0 else np.minimum(covered, distances)
+
+        return cls(list(graph.names), landmarks,
+                   np.column_stack(from_landmarks),
+                   np.column_stack(to_landmarks), compact)
+
+    def bounds(self, u, v):
+        """
+        Returns the lower bounds on cost(u, v) from all landmarks for the
+        ids u, which may be an array of ids, and v.
+        """
+        with np.errstate(invalid='ignore'):
+            bounds = np.maximum(self.to_landmarks[u] - self.to_landmarks[v],
+                                self.from_landmarks[v] - self.from_landmarks[u])
+        # bounds involving an unreachable landmark are no bounds
+        return np.where(np.isfinite(bounds), bounds, 0)
+
+    def __call__(self, u, v):
+        if not self.compact:
+            u, v = self.ids[u], self.ids[v]
+        return max(0.0, self.bounds(u, v).max())
+
+    def table(self, goals):
+        """
+        Computes the heuristic for all states and the given goals at once.
+        :param goals: A list of goal state names
+        :return: A HeuristicTable
+        """
+        states = range(len(self.names)) if self.compact else self.names
+        goal_ids = [self.ids[goal] for goal in goals]
+        columns = [np.maximum(self.bounds(np.arange(len(self.names)),
+                                          goal).max(axis=1), 0)
+                   for goal in goal_ids]
+        goal_states = goal_ids if self.compact else list(goals)
+        return HeuristicTable(list(states), goal_states,
+                              np.column_stack(columns))
@@ -0,0 +1,184 @@
+import heapq
+from compact_graph import CompactGraph
+from ex_graphsearch import Node, FailureException, UnvalidGoalException
+from search_stats import instrumented
+
+# the cost of unreached states
+UNREACHED = (float('inf'), 0)
+
+
+class LifelongPlanner(object):
+    """
+    Lifelong Planning A* (LPA*) between a fixed start and goal on a graph
+    whose edge costs change.
+
+    For every state the planner keeps g, the cost found by the last
+    search, and rhs, the cost given by the g values of its predecessors.
+    A state is inconsistent if both differ and only inconsistent states
+    are queued. Costs are (path cost, number of edges) tuples, otherwise
+    states on a cycle of zero cost edges, which sbahn has, could keep
+    each other's old costs after an increase. When an edge cost changes,
+    only its target is updated and the next call of plan() repairs the
+    costs of the states whose shortest path actually changes. Without
+    changes plan() expands the same states as an A-star-search.
+
+    Examples:
+    planner = LifelongPlanner(sbahn, 'Vaihingen', 'Waiblingen')
+    node = planner.plan()
+    planner.update_edge('Hauptbahnhof', 'Bad Cannstatt', 10)
+    planner.update_edge('Bad Cannstatt', 'Hauptbahnhof', 10)
+    node = planner.plan()  # only repairs the search
+    """
+    def __init__(self, graph, start, goal, heuristic=None):
+        """
+        The constructor for a LifelongPlanner. The edge costs of the graph
+        are copied, later changes are passed to update_edge().
+        :param graph: A nested dict or a CompactGraph, whose states are
+                      then ids like in the searches
+        :param start: The start state
+        :param goal: The goal state
+        :param heuristic: None or a consistent heuristic function like in
+                          a_star_search()
+        """
+        if goal not in graph or start not in graph:
+            raise UnvalidGoalException
+        if isinstance(graph, CompactGraph):
+            start, goal = graph.index(start), graph.index(goal)
+            states = range(len(graph))
+            edges = ((u, graph.neighbours(u)) for u in states)
+        else:
+            states = list(graph)
+            edges = ((u, graph[u].iteritems()) for u in states)
+
+        self.successors = dict((state, {}) for state in states)
+        self.predecessors = dict((state, {}) for state in states)
+        for u, neighbours in edges:
+            for v, cost in neighbours:
+                self.successors[u][v] = cost
+                self.predecessors.setdefault(v, {})[u] = cost
+                self.successors.setdefault(v, {})
+
+        self.start = start
+        self.goal = goal
+        self.heuristic = heuristic
+        self.estimates = {}
+        self.g = {}
+        self.rhs = {start: (0, 0)}
+        # the current key of each queued state, heap entries with another
+        # key are skipped
+        self.keys = {}
+        self.heap = []
+        self.push(start)
+
+    def estimate(self, state):
+        if self.heuristic is None:
+            return 0
+        estimate = self.estimates.get(state)
+        if estimate is None:
+            estimate = self.heuristic(state, self.goal)
+            self.estimates[state] = estimate
+        return estimate
+
+    def key(self, state):
+        cost = min(self.g.get(state, UNREACHED),
+                   self.rhs.get(state, UNREACHED))
+        return (cost[0] + self.estimate(state),) + cost
+
+    def push(self, state):
+        key = self.key(state)
+        self.keys[state] = key
+        heapq.heappush(self.heap, (key, state))
+
+    def top_key(self):
+        while self.heap and \
+                self.keys.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return (float('inf'),) + UNREACHED
+        return self.heap[0][0]
+
+    def update_state(self, state):
+        """
+        Recomputes rhs of a state and queues it if it is inconsistent.
+        """
+        if state != self.start:
+            rhs = UNREACHED
+            for p, cost in self.predecessors[state].iteritems():
+                g = self.g.get(p, UNREACHED)
+                if g[0] + cost < rhs[0] or \
+                        g[0] + cost == rhs[0] and g[1] + 1 < rhs[1]:
+                    rhs = (g[0] + cost, g[1] + 1)
+            self.rhs[state] = rhs
+        self.keys.pop(state, None)
+        if self.g.get(state, UNREACHED) != self.rhs.get(state, UNREACHED):
+            self.push(state)
+
+    def update_edge(self, u, v, cost):
+        """
+        Changes the cost of the edge from u to v. An edge is added if it
+        does not exist and removed if cost is infinity. For undirected
+        graphs like sbahn both directions have to be changed.
+        """
+        if u not in self.successors or v not in self.successors:
+            raise UnvalidGoalException
+        if cost == float('inf'):
+            self.successors[u].pop(v, None)
+            self.predecessors[v].pop(u, None)
+        else:
+            self.successors[u][v] = cost
+            self.predecessors[v][u] = cost
+        self.update_state(v)
+
+    @instrumented
+    def plan(self, stats=None):
+        """
+        Finds the shortest path with the current edge costs, reusing the
+        results of the previous calls.
+        :param stats: An optional search_stats.SearchStats that is filled in
+        :return: the goal Node, whose path() is the shortest path
+        """
+        if stats is not None: stats.phase('search')
+        goal = self.goal
+        while self.top_key() < self.key(goal) or \
+                self.rhs.get(goal, UNREACHED) != self.g.get(goal, UNREACHED):
+            _, u = heapq.heappop(self.heap)
+            del self.keys[u]
+            if self.g.get(u, UNREACHED) > self.rhs[u]:
+                self.g[u] = self.rhs[u]
+                changed = list(self.successors[u])
+            else:
+                # the cost of u increased, its successors may depend on it
+                self.g[u] = UNREACHED
+                changed = list(self.successors[u]) + [u]
+            for state in changed:
+                self.update_state(state)
+            if stats is not None: stats.expand(len(changed), len(self.keys))
+
+        if stats is not None: stats.phase('path')
+        if self.g.get(goal, UNREACHED) == UNREACHED:
+            raise FailureException
+        return self.path()
+
+    def path(self):
+        """
+        Follows the predecessors that give rhs back from the goal. The
+        number of edges decreases in each step, so there are no cycles.
+        :return: the goal Node
+        """
+        states = [self.goal]
+        while states[-1] != self.start:
+            state = states[-1]
+            for p, cost in self.predecessors[state].iteritems():
+                g = self.g.get(p, UNREACHED)
+                if (g[0] + cost, g[1] + 1) == self.rhs[state]:
+                    states.append(p)
+                    break
+            else:
+                raise FailureException
+        states.reverse()
+
+        node = Node(self.start, None, 0, 0)
+        for state in states[1:]:
+            node = Node(state, node, node.path_cost +
+                        self.successors[node.state][state], node.depth + 1)
+        return node
@@ -0,0 +1,142 @@
+import csv
+import gzip
+import os
+from array import array
+import numpy as np
+from compact_graph import CompactGraph
+
+
+def open_table(filename):
+    """
+    Opens a CSV or TSV file, which may be compressed with gzip, and
+    returns a csv reader for it. Files ending with .tsv or .tsv.gz are
+    tab separated, all others comma separated. Empty lines and lines
+    starting with '#' are skipped.
+    """
+    name = filename[:-3] if filename.endswith('.gz') else filename
+    delimiter = '\t' if name.endswith('.tsv') else ','
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'rb')
+    else:
+        f = open(filename, 'rb')
+    lines = (line for line in f if line.strip() and not line.startswith('#'))
+    return f, csv.reader(lines, delimiter=delimiter)
+
+
+def read_edges(filename, undirected=False):
+    """
+    Streams an edge list into a CompactGraph. Each row holds the source
+    name, the target name and the cost. A first row whose cost is not a
+    number is taken as header.
+
+    :param filename: The path of the edge list
+    :param undirected: If True, each row also adds the reverse edge
+    :return: A CompactGraph with numpy arrays
+    """
+    ids, names = {}, []
+    sources, targets, weights = array('i'), array('i'), array('d')
+    f, rows = open_table(filename)
+    with f:
+        for number, row in enumerate(rows):
+            try:
+                cost = float(row[2])
+            except ValueError:
+                if number == 0:
+                    continue
+                raise
+            for name in row[:2]:
+                if name not in ids:
+                    ids[name] = len(names)
+                    names.append(name)
+            u, v = ids[row[0]], ids[row[1]]
+            sources.append(u)
+            targets.append(v)
+            weights.append(cost)
+            if undirected:
+                sources.append(v)
+                targets.append(u)
+                weights.append(cost)
+
+    # sort the edges by source, keeping the order of the file otherwise
+    return CompactGraph.from_edges(names,
+                                   np.frombuffer(sources, dtype=np.int32),
+                                   np.frombuffer(targets, dtype=np.int32),
+                                   np.frombuffer(weights, dtype=float))
+
+
+def read_coordinates(filename, graph):
+    """
+    Streams a coordinate file into a numpy array. Each row holds a state
+    name and its x and y coordinate. Rows of states that are not in the
+    graph are ignored, states without a row get nan coordinates.
+
+    :param filename: The path of the coordinate file
+    :param graph: A CompactGraph which gives the row order
+    :return: A numpy array with shape (len(graph), 2), which can be used
+             with heuristics.HeuristicTable.from_coordinates()
+    """
+    points = np.full((len(graph), 2), np.nan)
+    f, rows = open_table(filename)
+    with f:
+        for number, row in enumerate(rows):
+            if row[0] not in graph.ids:
+                continue
+            try:
+                points[graph.ids[row[0]]] = [float(row[1]), float(row[2])]
+            except ValueError:
+                if number == 0:
+                    continue
+                raise
+    return points
+
+
+def load_graph(edges, coordinates=None, cache=None, undirected=False):
+    """
+    Loads a graph and optionally its coordinates. If a cache prefix is
+    given, the parsed arrays are written there as .npy files and later
+    calls memory map them instead of parsing the text files again. The
+    files and parameters the cache was built from are written to
+    cache + '_meta.txt', the cache is rebuilt when they differ or one of
+    the text files is newer.
+
+    :param edges: The path of the edge list, see read_edges()
+    :param coordinates: The path of the coordinate file or None
+    :param cache: A path prefix for the cache files or None
+    :param undirected: If True, each row also adds the reverse edge
+    :return: a tuple of the CompactGraph and the coordinate array (None
+             if no coordinate file is given)
+    """
+    sources = [edges] if coordinates is None else [edges, coordinates]
+    meta = ['edges\t' + os.path.abspath(edges),
+            'undirected\t' + str(bool(undirected))]
+    if coordinates is not None:
+        meta.append('coordinates\t' + os.path.abspath(coordinates))
+    if cache is not None:
+        meta_file = cache + '_meta.txt'
+        if os.path.exists(meta_file) and \
+                all(os.path.getmtime(s) <= os.path.getmtime(meta_file)
+                    for s in sources):
+            with open(meta_file, 'r') as f:
+                cached = f.read().splitlines()
+            if cached == meta:
+                graph = CompactGraph.load(cache)
+                points = None
+                if coordinates is not None:
+                    points = np.load(cache + '_coordinates.npy',
+                                     mmap_mode='r')
+                return graph, points
+            os.remove(meta_file)
+
+    graph = read_edges(edges, undirected)
+    points = None
+    if coordinates is not None:
+        points = read_coordinates(coordinates, graph)
+
+    if cache is not None:
+        if points is not None:
+            np.save(cache + '_coordinates.npy', points)
+        graph.save(cache)
+        # the meta file is written last, it marks a complete cache
+        with open(cache + '_meta.txt', 'w') as f:
+            f.write('\n'.join(meta) + '\n')
+    return graph, points
@@ -0,0 +1,136 @@
+import functools
+import inspect
+import time
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+
+class SearchStats(object):
+    """
+    Collects how much work a search did. Pass an instance as `stats` to
+    any search in ex_graphsearch, it is filled in while the search runs.
+    If a callback is given, it is called with the stats when the search
+    ends, also if it ends with an exception.
+
+    Examples:
+    stats = SearchStats()
+    uniform_cost_search(sbahn, 'Vaihingen', ['Waiblingen'], stats=stats)
+    stats.expanded  # the number of expanded nodes
+    stats.phases  # the wall time in seconds of each phase
+
+    :param algorithm: The name of the search function
+    :param generated: The number of generated successor nodes
+    :param expanded: The number of expanded nodes
+    :param skipped: The number of fringe entries that were dropped because
+                    their state was already explored or queued cheaper
+    :param max_fringe: The largest fringe size during the search
+    :param iterations: The number of depth limits of an iterative search
+    :param max_rss: The peak resident memory of the whole process in kB
+                    (ru_maxrss) when the search ended. It never decreases
+                    and includes everything the process allocated before
+                    the search, run the search in a fresh process to
+                    measure the search alone
+    :param phases: An OrderedDict with the wall time of each phase
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.algorithm = None
+        self.generated = 0
+        self.expanded = 0
+        self.skipped = 0
+        self.max_fringe = 0
+        self.iterations = 0
+        self.max_rss = None
+        self.phases = OrderedDict()
+        self.fringes = []
+        self.current_phase = None
+        self.phase_start = None
+
+    def begin(self, algorithm):
+        self.algorithm = algorithm
+        self.phase('prepare')
+
+    def phase(self, name):
+        """
+        Ends the current phase and starts a new one. The time of phases
+        with the same name is summed up.
+        """
+        now = time.time()
+        if self.current_phase is not None:
+            self.phases[self.current_phase] = \
+                self.phases.get(self.current_phase, 0.0) + now - self.phase_start
+        self.current_phase, self.phase_start = name, now
+
+    def watch(self, fringe):
+        """
+        Registers a NodePriorityQueue whose skipped entries are added
+        when the search ends.
+        """
+        self.fringes.append(fringe)
+
+    def expand(self, generated, fringe_size):
+        """
+        Counts one expanded node.
+        :param generated: The number of successors that were generated
+        :param fringe_size: The size of the fringe after the expansion
+        """
+        self.expanded += 1
+        self.generated += generated
+        if fringe_size > self.max_fringe:
+            self.max_fringe = fringe_size
+
+    def end(self):
+        self.phase(None)
+        for fringe in self.fringes:
+            self.skipped += fringe.skipped
+        self.fringes = []
+        if resource is not None:
+            self.max_rss = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+        if self.callback is not None:
+            self.callback(self)
+
+    def as_dict(self):
+        """
+        Returns the collected numbers as a dict, e.g. to store them as JSON
+        """
+        return OrderedDict([('algorithm', self.algorithm),
+                            ('generated', self.generated),
+                            ('expanded', self.expanded),
+                            ('skipped', self.skipped),
+                            ('max_fringe', self.max_fringe),
+                            ('iterations', self.iterations),
+                            ('max_rss', self.max_rss),
+                            ('phases', self.phases)])
+
+    def __str__(self):
+        return ", ".join("{}: {}".format(key, value)
+                         for key, value in self.as_dict().items())
+
+
+def instrumented(search):
+    """
+    A decorator for search functions with a `stats` parameter. If stats
+    is not None, it calls stats.begin() before and stats.end() after the
+    search. Without stats the search is called directly.
+    """
+    @functools.wraps(search)
+    def wrapper(*args, **kwargs):
+        stats = kwargs.get('stats')
+        if stats is None and len(args) > parameters.index('stats'):
+            stats = args[parameters.index('stats')]
+        if stats is None:
+            return search(*args, **kwargs)
+        stats.begin(search.__name__)
+        try:
+            return search(*args, **kwargs)
+        finally:
+            stats.end()
+
+    parameters = inspect.getargspec(search).args
+    return wrapper
@@ -0,0 +1,330 @@
+import heapq
+import itertools
+import numpy as np
+from compact_graph import CompactGraph
+
+
+def dijkstra(graph, source, is_id=False):
+    """
+    One-to-many uniform cost search from a source to every state.
+
+    :param graph: A CompactGraph
+    :param source: The name of the source state, or its id if is_id
+    :param is_id: True if source is an id. Names are never taken as ids,
+                  which would be ambiguous on graphs with int names
+    :return: a tuple of two numpy arrays indexed by id: the distance from
+             the source (inf if unreachable) and the predecessor on a
+             shortest path (-1 for the source and unreachable states)
+    """
+    source = graph.check_id(source) if is_id else graph.index(source)
+    n = len(graph)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    distances = [float('inf')] * n
+    predecessors = [-1] * n
+    done = [False] * n
+    distances[source] = 0
+    heap = [(0, source)]
+    while heap:
+        distance, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            if distance + weights[i] < distances[v]:
+                distances[v] = distance + weights[i]
+                predecessors[v] = u
+                heapq.heappush(heap, (distances[v], v))
+
+    return (np.array(distances, dtype=float),
+            np.array(predecessors, dtype=np.int32))
+
+
+def floyd_warshall(graph):
+    """
+    All-pairs shortest paths with the Floyd-Warshall algorithm. Each of
+    the n iterations is a single vectorized numpy operation on the whole
+    n x n matrix.
+
+    :param graph: A CompactGraph
+    :return: a tuple of two numpy arrays with shape (n, n), see
+             ShortestPathTable
+    """
+    n = len(graph)
+    sources = np.repeat(np.arange(n), np.diff(np.asarray(graph.offsets)))
+    targets = np.asarray(graph.targets)
+
+    distances = np.full((n, n), np.inf)
+    np.minimum.at(distances, (sources, targets), np.asarray(graph.weights))
+    np.fill_diagonal(distances, 0)
+    predecessors = np.where(np.isfinite(distances),
+                            np.arange(n, dtype=np.int32)[:, None], -1)
+    predecessors = predecessors.astype(np.int32)
+    np.fill_diagonal(predecessors, -1)
+
+    for k in range(n):
+        through_k = distances[:, k, None] + distances[None, k, :]
+        shorter = through_k < distances
+        distances = np.where(shorter, through_k, distances)
+        predecessors = np.where(shorter, predecessors[k], predecessors)
+
+    return distances, predecessors
+
+
+def reconstruct_path(predecessors, source, target):
+    """
+    Follows the predecessors from the target back to the source.
+    :param predecessors: The predecessor array of the source
+    :param source: The id of the source
+    :param target: The id of the target
+    :return: A list of ids from source to target or None if the target
+             is not reachable
+    """
+    path = [target]
+    while target != source:
+        target = predecessors[target]
+        if target < 0:
+            return None
+        path.append(int(target))
+    path.reverse()
+    return path
+
+
+class ShortestPathTable(object):
+    """
+    The cost of the shortest path between all pairs of states of a graph.
+
+    distances[u, v] is the cost from the state with id u to the state with
+    id v (inf if it is unreachable). predecessors[u, v] is the state before
+    v on a shortest path from u to v (-1 if v is u or unreachable). The
+    tables can be saved to disk and loaded again as memory maps, so a
+    query does not require a search any more.
+
+    Examples:
+    table = ShortestPathTable.from_graph(CompactGraph.from_dict(sbahn))
+    table.distance('Vaihingen', 'Waiblingen')  # returns the travel time
+    table.path('Vaihingen', 'Waiblingen')  # returns the station names
+    """
+    def __init__(self, names, distances, predecessors):
+        """
+        The constructor for a ShortestPathTable. Usually you want to use
+        ShortestPathTable.from_graph() or ShortestPathTable.load().
+        :param names: A list with the name of each id
+        :param distances: A numpy array with shape (n, n)
+        :param predecessors: A numpy array with shape (n, n)
+        """
+        self.names = names
+        self.ids = dict((name, i) for i, name in enumerate(names))
+        self.distances = distances
+        self.predecessors = predecessors
+
+    @classmethod
+    def from_graph(cls, graph, method='floyd_warshall'):
+        """
+        Computes the tables for a graph.
+        :param graph: A CompactGraph or a nested dict
+        :param method: 'floyd_warshall' for dense or small graphs or
+                       'dijkstra' to run dijkstra() from every state,
+                       which is faster for large sparse graphs
+        :return: A ShortestPathTable
+        """
+        if not isinstance(graph, CompactGraph):
+            graph = CompactGraph.from_dict(graph)
+
+        if method == 'floyd_warshall':
+            distances, predecessors = floyd_warshall(graph)
+        elif method == 'dijkstra':
+            n = len(graph)
+            distances = np.empty((n, n))
+            predecessors = np.empty((n, n), dtype=np.int32)
+            for u in range(n):
+                distances[u], predecessors[u] = dijkstra(graph, u, True)
+        else:
+            raise ValueError("Unknown method {}".format(method))
+
+        return cls(list(graph.names), distances, predecessors)
+
+    def save(self, prefix):
+        """
+        Writes the tables to prefix + '_distances.npy',
+        prefix + '_predecessors.npy' and the names to prefix + '_names.txt'
+        """
+        np.save(prefix + '_distances.npy', self.distances)
+        np.save(prefix + '_predecessors.npy', self.predecessors)
+        with open(prefix + '_names.txt', 'w') as f:
+            for name in self.names:
+                f.write(str(name) + '\n')
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        """
+        Loads tables written by save().
+        :param mmap: If True the arrays are memory mapped read-only
+                     instead of being read into memory
+        :return: A ShortestPathTable
+        """
+        mode = 'r' if mmap else None
+        distances = np.load(prefix + '_distances.npy', mmap_mode=mode)
+        predecessors = np.load(prefix + '_predecessors.npy', mmap_mode=mode)
+        with open(prefix + '_names.txt', 'r') as f:
+            names = [line.rstrip('\n') for line in f]
+        return cls(names, distances, predecessors)
+
+    def index(self, name):
+        """
+        Returns the id of a state name, a KeyError is raised for other
+        values. Ids are not accepted, on graphs with int names they could
+        not be told apart from names.
+        """
+        return self.ids[name]
+
+    def distance(self, start, goal):
+        """
+        Returns the cost of the shortest path between two states.
+        :param start: A state name
+        :param goal: A state name
+        :return: A float, inf if goal is not reachable
+        """
+        return self.distances[self.index(start), self.index(goal)].item()
+
+    def path(self, start, goal):
+        """
+        Returns the states on the shortest path between two states.
+        :param start: A state name
+        :param goal: A state name
+        :return: A list of state names from start to goal or None if the
+                 goal is not reachable
+        """
+        start, goal = self.index(start), self.index(goal)
+        path = reconstruct_path(self.predecessors[start], start, goal)
+        if path is None:
+            return None
+        return [self.names[i] for i in path]
+
+
+def spur_search(offsets, targets, weights, source, goal, to_goal,
+                blocked_nodes, blocked_edges):
+    """
+    A-star-search from source to goal that avoids some states and edges.
+    The costs to the goal in the unchanged graph are a consistent
+    heuristic, since blocking can only make paths longer.
+
+    :param offsets: The offsets of a CompactGraph as a list
+    :param targets: The targets of a CompactGraph as a list
+    :param weights: The weights of a CompactGraph as a list
+    :param source: The start id
+    :param goal: The goal id
+    :param to_goal: A list with the cost from each id to the goal
+    :param blocked_nodes: A set of ids that must not be visited
+    :param blocked_edges: A set of (u, v) id pairs that must not be used
+    :return: a tuple of the list of ids from source to goal and the list
+             of the path costs to each of them or None if there is no path
+    """
+    infinity = float('inf')
+    costs = {source: 0}
+    parents = {source: -1}
+    closed = set()
+    heap = [(to_goal[source], 0, source)]
+    while heap:
+        _, cost, u = heapq.heappop(heap)
+        if u in closed:
+            continue
+        if u == goal:
+            path = [u]
+            while parents[path[-1]] >= 0:
+                path.append(parents[path[-1]])
+            path.reverse()
+            return path, [costs[v] for v in path]
+        closed.add(u)
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            if v in closed or v in blocked_nodes or to_goal[v] == infinity:
+                continue
+            if (u, v) in blocked_edges:
+                continue
+            if cost + weights[i] < costs.get(v, infinity):
+                costs[v] = cost + weights[i]
+                parents[v] = u
+                heapq.heappush(heap, (costs[v] + to_goal[v], costs[v], v))
+    return None
+
+
+def k_shortest_paths(graph, start, goal, k):
+    """
+    The k cheapest loopless paths from start to goal with Yen's
+    algorithm. Each further path leaves an earlier one at a spur state
+    and reaches the goal with a search that avoids the states before the
+    spur state and the edges the earlier paths took from there.
+
+    The shortest path tree to the goal is computed once. It gives the
+    first path and is the heuristic of all spur searches, which then
+    expand hardly more than the states on their path. As in Lawler's
+    variant, a path is only spurred from the state where it left its
+    predecessor on.
+
+    Examples:
+    k_shortest_paths(sbahn, 'Vaihingen', 'Waiblingen', 3)
+
+    :param graph: A CompactGraph or a nested dict
+    :param start: The name or id of the start state
+    :param goal: The name or id of the goal state
+    :param k: The maximum number of paths
+    :return: A list of at most k tuples of the path cost and the list of
+             state names from start to goal, ordered by cost
+    """
+    if not isinstance(graph, CompactGraph):
+        graph = CompactGraph.from_dict(graph)
+    start, goal = graph.index(start), graph.index(goal)
+
+    # the shortest path tree to the goal is searched on the reverse graph
+    sources = np.repeat(np.arange(len(graph)), np.diff(np.asarray(graph.offsets)))
+    reverse = CompactGraph.from_edges(graph.names, graph.targets, sources,
+                                      graph.weights)
+    to_goal, next_state = dijkstra(reverse, goal, True)
+    if not np.isfinite(to_goal[start]) or k < 1:
+        return []
+    to_goal = to_goal.tolist()
+    offsets = np.asarray(graph.offsets).tolist()
+    targets = np.asarray(graph.targets).tolist()
+    weights = np.asarray(graph.weights).tolist()
+
+    path, costs = [start], [0]
+    while path[-1] != goal:
+        u, v = path[-1], int(next_state[path[-1]])
+        costs.append(costs[-1] + min(weights[i] for i in
+                                     range(offsets[u], offsets[u + 1])
+                                     if targets[i] == v))
+        path.append(v)
+
+    # each path is stored with the path costs to its states and the
+    # index of the state where it left the path it was spurred from
+    paths = [(path, costs, 0)]
+    candidates = []
+    seen = set([tuple(path)])
+    counter = itertools.count()
+    while len(paths) < k:
+        path, costs, deviation = paths[-1]
+        for j in range(deviation, len(path) - 1):
+            root = path[:j + 1]
+            blocked_edges = set((p[j], p[j + 1]) for p, _, _ in paths
+                                if p[:j + 1] == root)
+            spur = spur_search(offsets, targets, weights, path[j], goal,
+                               to_goal, set(root[:-1]), blocked_edges)
+            if spur is None:
+                continue
+            spur_path, spur_costs = spur
+            candidate = root[:-1] + spur_path
+            if tuple(candidate) in seen:
+                continue
+            seen.add(tuple(candidate))
+            candidate_costs = costs[:j] + [costs[j] + c for c in spur_costs]
+            heapq.heappush(candidates, (candidate_costs[-1], next(counter),
+                                        candidate, candidate_costs, j))
+        if not candidates:
+            break
+        _, _, path, costs, deviation = heapq.heappop(candidates)
+        paths.append((path, costs, deviation))
+
+    return [(costs[-1], [graph.names[state] for state in path])
+            for path, costs, _ in paths]
@@ -1,7 +1,26 @@
 import unittest
 import ex_graphsearch as ex
 import random
+import itertools
 import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from heuristics import HeuristicTable, LandmarkHeuristic
+from shortest_paths import dijkstra, ShortestPathTable, k_shortest_paths
+from contraction import ContractionHierarchy
+import loader
+import batch
+import benchmark
+from incremental import LifelongPlanner
+from search_stats import SearchStats
+import csv
+import gzip
+import copy
+from collections import OrderedDict
 from data import graph, sbahn, coordinates
 
 
@@ -24,6 +43,37 @@ def sbahn_heuristic(u, v):
     return int(distance/speed)
 
 
+def zero_heuristic(u, v):
+    return 0
+
+
+def sbahn_distance(points, goal):
+    distance = np.sqrt(np.abs(points - goal).sum(axis=1))
+    speed = 100.0
+    return (distance / speed).astype(int)
+
+
+def puzzle_successors(state):
+    # the 8-puzzle, 0 is the blank
+    blank = state.index(0)
+    row, column = divmod(blank, 3)
+    for r, c in [(row - 1, column), (row + 1, column),
+                 (row, column - 1), (row, column + 1)]:
+        if 0 <= r < 3 and 0 <= c < 3:
+            successor = list(state)
+            successor[blank], successor[3 * r + c] = state[3 * r + c], 0
+            yield tuple(successor), 1
+
+
+def puzzle_heuristic(u, v):
+    distance = 0
+    for tile in range(1, 9):
+        row, column = divmod(u.index(tile), 3)
+        goal_row, goal_column = divmod(v.index(tile), 3)
+        distance += abs(row - goal_row) + abs(column - goal_column)
+    return distance
+
+
 def check_path(self, path, node):
     p = []
     while node is not None:
@@ -82,6 +132,36 @@ class DFSTest(unittest.TestCase):
             ex.depth_limited_search(sbahn, 'Zuffenhausen', ['Universitaet'], 6)
 
 
+class DepthLimitedStackSearchTest(unittest.TestCase):
+    def test_cutoff_flag(self):
+        start = ex.Node('Zuffenhausen', None, 0, 0)
+        node, cutoff = ex.depth_limited_stack_search(sbahn, start,
+                                                     set(['Universitaet']), 6)
+        self.assertIsNone(node)
+        self.assertTrue(cutoff)
+        node, cutoff = ex.depth_limited_stack_search(
+            {'A': {'B': 1}, 'B': {}}, ex.Node('A', None, 0, 0), set(['C']), 5)
+        self.assertIsNone(node)
+        self.assertFalse(cutoff)
+
+    def test_no_recursion_limit(self):
+        chain = dict((i, {i + 1: 1}) for i in range(5000))
+        chain[5000] = {}
+        node = ex.depth_limited_search(chain, 0, [5000], 6000)
+        self.assertEqual(node.depth, 5000)
+        node = ex.iterative_deepening_search(chain, 0, [3000])
+        self.assertEqual(node.path_cost, 3000)
+
+    def test_boundary_is_carried(self):
+        for max_boundary in [0, 10, 10000]:
+            node = ex.iterative_deepening_search(sbahn, 'Zuffenhausen',
+                                                  ['Universitaet'],
+                                                  max_boundary=max_boundary)
+            check_path(self, ['Universitaet', 'Schwabstrasse', 'Feuersee',
+                              'Stadtmitte', 'Hauptbahnhof', 'Nordbahnhof',
+                              'Feuerbach', 'Zuffenhausen'], node)
+
+
 class BFSTest(unittest.TestCase):
     def test_small_graph(self):
         node, fringe = ex.breadth_first_search(graph, 'A', ['C'])
@@ -187,3 +267,917 @@ class AStarTest(unittest.TestCase):
         check_path(self, ['Schwabstrasse', 'Feuersee', 'Stadtmitte', 
                           'Hauptbahnhof', 'Nordbahnhof', 'Feuerbach', 
                           'Zuffenhausen'], node)
+
+
+class IDAStarTest(unittest.TestCase):
+    def test_small_graph(self):
+        node = ex.ida_star_search(graph, 'A', ['C'], air_heuristic)
+        check_path(self, ['C', 'A'], node)
+
+    def test_vaihingen_hauptbahnhof(self):
+        stats = SearchStats()
+        node = ex.ida_star_search(sbahn, 'Hauptbahnhof', ['Vaihingen'],
+                                  sbahn_heuristic, stats=stats)
+        check_path(self, ['Vaihingen', 'Oesterfeld', 'Universitaet',
+                          'Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                          'Hauptbahnhof'], node)
+        self.assertGreater(stats.iterations, 1)
+
+    def test_same_cost_as_uniform_cost_search(self):
+        cg = ex.CompactGraph.from_dict(sbahn)
+        for start, goal in [('Rommelshausen', 'Waldau'),
+                            ('Gaertringen', 'Berliner Platz')]:
+            expected, _ = ex.uniform_cost_search(sbahn, start, [goal])
+            node = ex.ida_star_search(cg, start, [goal], zero_heuristic)
+            self.assertEqual(node.path_cost, expected.path_cost)
+
+    def test_unreachable_goal(self):
+        self.assertRaises(ex.FailureException, ex.ida_star_search, sbahn,
+                          'Cannstatter Wasen', ['Vaihingen'], sbahn_heuristic)
+
+
+class SMAStarTest(unittest.TestCase):
+    def test_small_graph(self):
+        node, fringe = ex.sma_star_search(graph, 'A', ['C'], air_heuristic, 3)
+        check_path(self, ['C', 'A'], node)
+
+    def test_vaihingen_hauptbahnhof(self):
+        for max_nodes in [10000, 20, 7]:
+            node, fringe = ex.sma_star_search(sbahn, 'Hauptbahnhof',
+                                              ['Vaihingen'], sbahn_heuristic,
+                                              max_nodes)
+            check_path(self, ['Vaihingen', 'Oesterfeld', 'Universitaet',
+                              'Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                              'Hauptbahnhof'], node)
+
+    def test_same_cost_as_uniform_cost_search(self):
+        for start, goal in [('Rommelshausen', 'Waldau'),
+                            ('Olgaeck', 'Eckartshaldenweg'),
+                            ('Rosensteinbruecke', 'Uff-Kirchhof')]:
+            expected, _ = ex.uniform_cost_search(sbahn, start, [goal])
+            for max_nodes in [30, expected.depth + 2]:
+                node, _ = ex.sma_star_search(sbahn, start, [goal],
+                                             sbahn_heuristic, max_nodes)
+                self.assertEqual(node.path_cost, expected.path_cost)
+
+    def test_less_memory_more_expansions(self):
+        small, large = SearchStats(), SearchStats()
+        ex.sma_star_search(sbahn, 'Olgaeck', ['Eckartshaldenweg'],
+                           sbahn_heuristic, 10, stats=small)
+        ex.sma_star_search(sbahn, 'Olgaeck', ['Eckartshaldenweg'],
+                           sbahn_heuristic, stats=large)
+        self.assertGreater(small.expanded, large.expanded)
+        self.assertLessEqual(small.max_fringe, 10)
+
+    def test_heaps_bounded_by_nodes(self):
+        # on a grid the few nodes in memory are forgotten and regenerated
+        # thousands of times, the outdated heap entries must not pile up
+        grid = dict(((r, c), dict(((r + dr, c + dc), 1)
+                                  for dr, dc in [(0, 1), (1, 0), (0, -1),
+                                                 (-1, 0)]
+                                  if 0 <= r + dr < 6 and 0 <= c + dc < 6))
+                    for r in range(6) for c in range(6))
+        sizes = []
+
+        class HeapStats(SearchStats):
+            def expand(self, generated, fringe_size):
+                super(HeapStats, self).expand(generated, fringe_size)
+                fringe = self.fringes[0]
+                sizes.append(max(len(fringe.best), len(fringe.worst)))
+
+        stats = HeapStats()
+        node, _ = ex.sma_star_search(grid, (0, 0), [(5, 5)],
+                                     lambda u, v: 0, 12, stats=stats)
+        self.assertEqual(node.path_cost, 10)
+        self.assertGreater(stats.expanded, 1000)
+        self.assertLessEqual(max(sizes), 8 * 12 + 64)
+
+    def test_cutoff(self):
+        # the path has 7 states
+        self.assertRaises(ex.CutoffException, ex.sma_star_search, sbahn,
+                          'Hauptbahnhof', ['Vaihingen'], sbahn_heuristic, 6)
+        self.assertRaises(ex.FailureException, ex.sma_star_search, sbahn,
+                          'Cannstatter Wasen', ['Vaihingen'], sbahn_heuristic)
+
+
+class SuccessorFunctionTest(unittest.TestCase):
+    goal = (1, 2, 3, 4, 5, 6, 7, 8, 0)
+    start = (4, 1, 3, 7, 2, 6, 0, 5, 8)
+
+    def test_puzzle(self):
+        expected, _ = ex.breadth_first_search(puzzle_successors, self.start,
+                                              [self.goal], graph_search=True)
+        self.assertEqual(expected.depth, 6)
+        node, _ = ex.uniform_cost_search(puzzle_successors, self.start,
+                                         [self.goal], graph_search=True)
+        self.assertEqual(node.path_cost, 6)
+        node, _ = ex.a_star_search(puzzle_successors, self.start,
+                                   [self.goal], puzzle_heuristic)
+        self.assertEqual(node.path_cost, 6)
+        node = ex.ida_star_search(puzzle_successors, self.start,
+                                  [self.goal], puzzle_heuristic)
+        self.assertEqual(node.path_cost, 6)
+        node = ex.iterative_deepening_search(puzzle_successors, self.start,
+                                             [self.goal], graph_search=True)
+        self.assertEqual(node.depth, 6)
+        node, _ = ex.bidirectional_search(puzzle_successors, self.start,
+                                          [self.goal])
+        self.assertEqual(node.path_cost, 6)
+
+    def test_lazy_generation(self):
+        def numbers(n):
+            # infinitely many successors
+            for i in itertools.count(n + 1):
+                yield i, 1
+        node = ex.depth_limited_search(numbers, 0, [5], 1)
+        check_path(self, [5, 0], node)
+        node = ex.depth_limited_search(numbers, 0, [5], 2, graph_search=True)
+        check_path(self, [5, 1, 0], node)
+
+
+class BidirectionalSearchTest(unittest.TestCase):
+    def test_same_cost_as_uniform_cost_search(self):
+        stations = list(sbahn)[::20]
+        for start in stations:
+            for goal in stations:
+                try:
+                    expected, _ = ex.uniform_cost_search(sbahn, start, [goal])
+                except ex.FailureException:
+                    with self.assertRaises(ex.FailureException):
+                        ex.bidirectional_uniform_cost_search(sbahn, start,
+                                                             [goal])
+                    continue
+                node, _ = ex.bidirectional_uniform_cost_search(sbahn, start,
+                                                               [goal])
+                self.assertEqual(node.path_cost, expected.path_cost)
+                node, _ = ex.bidirectional_a_star_search(sbahn, start, [goal],
+                                                         sbahn_heuristic)
+                self.assertEqual(node.path_cost, expected.path_cost)
+
+    def test_zuffenhausen_universitaet(self):
+        node, fringe = ex.bidirectional_uniform_cost_search(
+            sbahn, 'Zuffenhausen', ['Universitaet'])
+        check_path(self, ['Universitaet', 'Schwabstrasse', 'Feuersee',
+                          'Stadtmitte', 'Hauptbahnhof', 'Nordbahnhof',
+                          'Feuerbach', 'Zuffenhausen'], node)
+        self.assertEqual(node.depth, 7)
+        self.assertEqual(node.path_cost, 15)
+
+    def test_directed_graph(self):
+        directed = {'A': {'B': 1, 'C': 5}, 'B': {'C': 1}, 'C': {}}
+        reverse = {'A': {}, 'B': {'A': 1}, 'C': {'A': 5, 'B': 1}}
+        node, _ = ex.bidirectional_uniform_cost_search(directed, 'A', ['C'],
+                                                       reverse)
+        check_path(self, ['C', 'B', 'A'], node)
+        node, _ = ex.bidirectional_uniform_cost_search(directed, 'C', ['C'],
+                                                       reverse)
+        check_path(self, ['C'], node)
+
+
+class GraphSearchTest(unittest.TestCase):
+    def test_breadth_first_search(self):
+        node, fringe = ex.breadth_first_search(sbahn, 'Zuffenhausen',
+                                                ['Universitaet'], True)
+        check_path(self, ['Universitaet', 'Schwabstrasse', 'Feuersee',
+                          'Stadtmitte', 'Hauptbahnhof', 'Nordbahnhof',
+                          'Feuerbach', 'Zuffenhausen'], node)
+        _, tree_fringe = ex.breadth_first_search(sbahn, 'Zuffenhausen',
+                                                 ['Universitaet'])
+        self.assertLess(fringe.qsize() * 100, tree_fringe.qsize())
+
+    def test_depth_limited_search(self):
+        node = ex.depth_limited_search(sbahn, 'Zuffenhausen',
+                                        ['Universitaet'], 12, True)
+        states = []
+        while node is not None:
+            self.assertNotIn(node.state, states)
+            states.append(node.state)
+            node = node.parent
+        with self.assertRaises(ex.CutoffException):
+            ex.depth_limited_search(sbahn, 'Zuffenhausen', ['Universitaet'],
+                                    6, True)
+
+    def test_iterative_deepening_search(self):
+        node = ex.iterative_deepening_search(sbahn, 'Hauptbahnhof',
+                                              ['Vaihingen'], True)
+        check_path(self, ['Vaihingen', 'Oesterfeld', 'Universitaet',
+                          'Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                          'Hauptbahnhof'], node)
+        with self.assertRaises(ex.FailureException):
+            ex.iterative_deepening_search({'A': {'B': 1}, 'B': {'A': 1},
+                                           'C': {}}, 'A', ['C'], True)
+
+    def test_uniform_cost_and_a_star_search(self):
+        node, _ = ex.uniform_cost_search(sbahn, 'Hauptbahnhof', ['Vaihingen'],
+                                         True)
+        check_path(self, ['Vaihingen', 'Oesterfeld', 'Universitaet',
+                          'Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                          'Hauptbahnhof'], node)
+        node, _ = ex.a_star_search(sbahn, 'Hauptbahnhof', ['Vaihingen'],
+                                   sbahn_heuristic, True)
+        check_path(self, ['Vaihingen', 'Oesterfeld', 'Universitaet',
+                          'Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                          'Hauptbahnhof'], node)
+
+
+class SearchStatsTest(unittest.TestCase):
+    def test_uniform_cost_search(self):
+        stats = SearchStats()
+        node, fringe = ex.uniform_cost_search(sbahn, 'Hauptbahnhof',
+                                               ['Vaihingen'], stats=stats)
+        self.assertEqual(stats.algorithm, 'uniform_cost_search')
+        self.assertGreater(stats.expanded, 0)
+        self.assertGreaterEqual(stats.generated, stats.expanded)
+        self.assertEqual(stats.skipped, fringe.skipped)
+        self.assertGreater(stats.max_fringe, 0)
+        self.assertListEqual(list(stats.phases), ['prepare', 'search'])
+        self.assertGreater(stats.max_rss, 0)
+
+    def test_graph_search_expands_less(self):
+        tree, graph_search = SearchStats(), SearchStats()
+        ex.breadth_first_search(sbahn, 'Zuffenhausen', ['Universitaet'],
+                                stats=tree)
+        ex.breadth_first_search(sbahn, 'Zuffenhausen', ['Universitaet'], True,
+                                graph_search)
+        self.assertLess(graph_search.expanded * 10, tree.expanded)
+        self.assertLess(graph_search.max_fringe * 10, tree.max_fringe)
+
+    def test_iterative_deepening_search(self):
+        stats = SearchStats()
+        ex.iterative_deepening_search(sbahn, 'Hauptbahnhof', ['Vaihingen'],
+                                      stats=stats)
+        self.assertEqual(stats.iterations, 6)
+        self.assertListEqual(list(stats.phases),
+                             ['prepare', 'search', 'boundary'])
+        stats = SearchStats()
+        ex.depth_limited_search(sbahn, 'Zuffenhausen', ['Universitaet'], 12,
+                                True, stats=stats)
+        self.assertGreater(stats.skipped, 0)
+
+    def test_callback(self):
+        calls = []
+        stats = SearchStats(calls.append)
+        with self.assertRaises(ex.FailureException):
+            ex.a_star_search({'A': {'B': 1}, 'B': {}, 'C': {}}, 'A', ['C'],
+                             lambda u, v: 0, stats=stats)
+        self.assertListEqual(calls, [stats])
+        self.assertEqual(stats.as_dict()['expanded'], 2)
+
+
+class NodeTest(unittest.TestCase):
+    def test_path(self):
+        node = ex.Node('A', None, 0, 0)
+        node = ex.Node('B', node, 20, 1)
+        node = ex.Node('C', node, 40, 2)
+        self.assertListEqual(node.path(), ['A', 'B', 'C'])
+        self.assertEqual(str(node), "'C', 'B', 'A'")
+
+    def test_long_path(self):
+        node = ex.Node(0, None, 0, 0)
+        for i in range(1, 20000):
+            node = ex.Node(i, node, i, i)
+        self.assertListEqual(node.path(), list(range(20000)))
+        self.assertTrue(str(node).startswith("'19999', '19998'"))
+
+    def test_no_instance_dict(self):
+        node = ex.Node('A', None, 0, 0)
+        with self.assertRaises(AttributeError):
+            node.children = []
+
+
+class NodePriorityQueueTest(unittest.TestCase):
+    def test_decrease_key(self):
+        fringe = ex.NodePriorityQueue()
+        fringe.put(ex.Node('A', None, 5, 0))
+        fringe.put(ex.Node('B', None, 3, 0))
+        fringe.put(ex.Node('A', None, 1, 0))
+        fringe.put(ex.Node('B', None, 4, 0))
+        self.assertEqual(len(fringe), 2)
+        node = fringe.get()
+        self.assertEqual((node.state, node.path_cost), ('A', 1))
+        node = fringe.get()
+        self.assertEqual((node.state, node.path_cost), ('B', 3))
+        self.assertTrue(fringe.empty())
+
+    def test_ties_and_visited(self):
+        fringe = ex.NodePriorityQueue()
+        for state in ['C', 'A', 'B']:
+            fringe.put(ex.Node(state, None, 0, 0))
+        self.assertEqual(fringe.get().state, 'C')
+        fringe.put(ex.Node('C', None, 0, 0))
+        check_fringe(self, ['A', 'B'], fringe)
+        with self.assertRaises(ex.FailureException):
+            fringe.get()
+
+    def test_unreachable_goal(self):
+        with self.assertRaises(ex.FailureException):
+            ex.uniform_cost_search({'A': {'B': 1}, 'B': {}, 'C': {}}, 'A',
+                                   ['C'])
+
+
+class HeuristicTableTest(unittest.TestCase):
+    goals = ['Universitaet', 'Schwabstrasse', 'Vaihingen']
+
+    def test_from_coordinates(self):
+        h = HeuristicTable.from_coordinates(sbahn, coordinates, self.goals,
+                                            sbahn_distance)
+        for state in sbahn:
+            for goal in self.goals:
+                self.assertEqual(h(state, goal), sbahn_heuristic(state, goal))
+            self.assertEqual(h.estimate(state),
+                             min(sbahn_heuristic(state, goal)
+                                 for goal in self.goals))
+
+    def test_from_function(self):
+        h = HeuristicTable.from_function(air_heuristic, list(graph), ['C'])
+        self.assertListEqual([h.estimate(s) for s in 'ABCD'], [20, 18, 0, 50])
+
+    def test_a_star_search(self):
+        h = HeuristicTable.from_coordinates(sbahn, coordinates, self.goals,
+                                            sbahn_distance)
+        node, fringe = ex.a_star_search(sbahn, 'Zuffenhausen', self.goals, h)
+        check_path(self, ['Schwabstrasse', 'Feuersee', 'Stadtmitte',
+                          'Hauptbahnhof', 'Nordbahnhof', 'Feuerbach',
+                          'Zuffenhausen'], node)
+        with self.assertRaises(ValueError):
+            ex.a_star_search(sbahn, 'Zuffenhausen', ['Vaihingen'], h)
+
+    def test_compact_graph(self):
+        cg = ex.CompactGraph.from_dict(sbahn)
+        h = HeuristicTable.from_coordinates(cg, coordinates, ['Vaihingen'],
+                                            sbahn_distance)
+        node, fringe = ex.a_star_search(cg, 'Hauptbahnhof', ['Vaihingen'], h)
+        self.assertListEqual(cg.path(node),
+                             ['Hauptbahnhof', 'Stadtmitte', 'Feuersee',
+                              'Schwabstrasse', 'Universitaet', 'Oesterfeld',
+                              'Vaihingen'])
+
+    def test_not_imported_by_searches(self):
+        # tables are recognized without importing the heuristics module,
+        # so the searches run without numpy
+        code = ("import sys\n"
+                "sys.modules['numpy'] = None\n"
+                "import ex_graphsearch as ex\n"
+                "node, _ = ex.breadth_first_search(ex.graph, 'A', ['C'])\n"
+                "cg = ex.CompactGraph.from_dict(ex.sbahn)\n"
+                "node, _ = ex.uniform_cost_search(cg, 'Vaihingen',\n"
+                "                                 ['Hauptbahnhof'])\n"
+                "sys.exit('heuristics' in sys.modules)")
+        here = os.path.dirname(os.path.abspath(__file__))
+        self.assertEqual(subprocess.call([sys.executable, '-c', code],
+                                         cwd=here), 0)
+
+    def test_memoized_estimate(self):
+        calls = []
+
+        def heuristic(u, v):
+            calls.append(u)
+            return sbahn_heuristic(u, v)
+
+        fringe = ex.NodePriorityQueue(heuristic, self.goals)
+        for _ in range(3):
+            fringe.put(ex.Node('Feuerbach', None, 0, 0))
+        self.assertEqual(len(calls), len(self.goals))
+
+
+class ShortestPathTableTest(unittest.TestCase):
+    def setUp(self):
+        self.sbahn = ex.CompactGraph.from_dict(sbahn)
+
+    def check_table(self, table):
+        for start in list(sbahn)[::20]:
+            for goal in list(sbahn)[::20]:
+                try:
+                    expected, _ = ex.uniform_cost_search(sbahn, start, [goal])
+                except ex.FailureException:
+                    self.assertEqual(table.distance(start, goal), np.inf)
+                    self.assertIsNone(table.path(start, goal))
+                    continue
+                self.assertEqual(table.distance(start, goal),
+                                 expected.path_cost)
+                path = table.path(start, goal)
+                self.assertEqual((path[0], path[-1]), (start, goal))
+                self.assertEqual(sum(sbahn[u][v]
+                                     for u, v in zip(path, path[1:])),
+                                 expected.path_cost)
+
+    def test_dijkstra(self):
+        distances, predecessors = dijkstra(self.sbahn, 'Vaihingen')
+        node, _ = ex.uniform_cost_search(sbahn, 'Vaihingen', ['Waiblingen'])
+        self.assertEqual(distances[self.sbahn.index('Waiblingen')],
+                         node.path_cost)
+        self.assertEqual(distances[self.sbahn.index('Vaihingen')], 0)
+        self.assertEqual(predecessors[self.sbahn.index('Vaihingen')], -1)
+
+    def test_floyd_warshall(self):
+        self.check_table(ShortestPathTable.from_graph(self.sbahn))
+
+    def test_repeated_dijkstra(self):
+        table = ShortestPathTable.from_graph(sbahn, 'dijkstra')
+        self.check_table(table)
+        np.testing.assert_array_equal(
+            table.distances, ShortestPathTable.from_graph(sbahn).distances)
+
+    def test_int_names(self):
+        # the ids 0, 1, 2 belong to the names 2, 0, 1
+        graph = ex.CompactGraph.from_dict(
+            OrderedDict([(2, {0: 1}), (0, {1: 5}), (1, {2: 1})]))
+        for method in ['floyd_warshall', 'dijkstra']:
+            table = ShortestPathTable.from_graph(graph, method)
+            self.assertEqual(table.distance(2, 1), 6)
+            self.assertListEqual(table.path(2, 1), [2, 0, 1])
+            self.assertListEqual(table.path(1, 0), [1, 2, 0])
+        distances, _ = dijkstra(graph, 0)
+        self.assertListEqual(distances.tolist(), [6, 0, 5])
+        distances, _ = dijkstra(graph, 0, True)
+        self.assertListEqual(distances.tolist(), [0, 1, 6])
+        self.assertRaises(KeyError, table.distance, 2, 3)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            prefix = os.path.join(directory, 'sbahn')
+            ShortestPathTable.from_graph(self.sbahn).save(prefix)
+            table = ShortestPathTable.load(prefix)
+            self.assertIsInstance(table.distances, np.memmap)
+            self.check_table(table)
+        finally:
+            shutil.rmtree(directory)
+
+
+def simple_paths(graph, path, goal, cost=0):
+    # all loopless paths from path[-1] to goal by brute force
+    if path[-1] == goal:
+        yield cost, list(path)
+        return
+    for neighbour, edge_cost in graph[path[-1]].items():
+        if neighbour not in path:
+            path.append(neighbour)
+            for result in simple_paths(graph, path, goal, cost + edge_cost):
+                yield result
+            path.pop()
+
+
+class KShortestPathsTest(unittest.TestCase):
+    def test_small_graph(self):
+        self.assertListEqual(k_shortest_paths(graph, 'A', 'C', 5),
+                             [(30, ['A', 'C']), (40, ['A', 'B', 'C'])])
+        self.assertListEqual(k_shortest_paths(graph, 'D', 'C', 1),
+                             [(55, ['D', 'A', 'C'])])
+
+    def test_random_directed_graphs(self):
+        random.seed(3)
+        for _ in range(30):
+            g = dict((i, {}) for i in range(8))
+            for _ in range(18):
+                u, v = random.sample(range(8), 2)
+                g[u][v] = random.randint(1, 5)
+            expected = sorted(simple_paths(g, [0], 7))
+            paths = k_shortest_paths(g, 0, 7, 6)
+            self.assertListEqual([cost for cost, _ in paths],
+                                 [cost for cost, _ in expected[:6]])
+            for cost, path in paths:
+                self.assertIn((cost, path), expected)
+
+    def test_sbahn(self):
+        paths = k_shortest_paths(sbahn, 'Vaihingen', 'Waiblingen', 10)
+        self.assertEqual(len(paths), 10)
+        node, _ = ex.uniform_cost_search(sbahn, 'Vaihingen', ['Waiblingen'])
+        self.assertEqual(paths[0][0], node.path_cost)
+        self.assertEqual(len(set(tuple(path) for _, path in paths)), 10)
+        for i, (cost, path) in enumerate(paths):
+            self.assertEqual(len(set(path)), len(path))
+            self.assertEqual(cost, sum(sbahn[u][v] for u, v in
+                                       zip(path, path[1:])))
+            if i > 0:
+                self.assertGreaterEqual(cost, paths[i - 1][0])
+
+    def test_unreachable(self):
+        self.assertListEqual(k_shortest_paths(sbahn, 'Vaihingen',
+                                              'Cannstatter Wasen', 3), [])
+
+
+class ContractionHierarchyTest(unittest.TestCase):
+    def setUp(self):
+        self.ch = ContractionHierarchy.from_graph(sbahn)
+        self.table = ShortestPathTable.from_graph(sbahn)
+
+    def check_queries(self, ch):
+        for start in list(sbahn)[::3]:
+            for goal in list(sbahn)[::3]:
+                cost, path = ch.query(start, goal)
+                self.assertEqual(cost, self.table.distance(start, goal))
+                self.assertLess(ch.settled, len(sbahn) / 2)
+                if path is None:
+                    continue
+                self.assertEqual((path[0], path[-1]), (start, goal))
+                self.assertEqual(sum(sbahn[u][v]
+                                     for u, v in zip(path, path[1:])), cost)
+
+    def test_query(self):
+        self.check_queries(self.ch)
+
+    def test_same_as_uniform_cost_search(self):
+        node, _ = ex.uniform_cost_search(sbahn, 'Zuffenhausen',
+                                         ['Universitaet'])
+        cost, path = self.ch.query('Zuffenhausen', 'Universitaet')
+        self.assertEqual(cost, node.path_cost)
+        check_path(self, list(reversed(path)), node)
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'sbahn_ch.npz')
+            self.ch.save(filename)
+            self.check_queries(ContractionHierarchy.load(filename))
+        finally:
+            shutil.rmtree(directory)
+
+
+class LoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.edges = os.path.join(self.directory, 'sbahn.csv.gz')
+        with gzip.open(self.edges, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(['from', 'to', 'minutes'])
+            for u in sbahn:
+                for v in sbahn[u]:
+                    writer.writerow([u, v, sbahn[u][v]])
+        self.coordinates = os.path.join(self.directory, 'coordinates.tsv')
+        with open(self.coordinates, 'wb') as f:
+            f.write('# name\tx\ty\n')
+            for name in coordinates:
+                f.write('\t'.join([name] + coordinates[name]) + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_graph(self, cg, points):
+        # an edge list cannot contain stations without any edge
+        self.assertEqual(len(cg), len([u for u in sbahn if sbahn[u]]))
+        for u in range(len(cg)):
+            self.assertDictEqual(dict((cg.names[v], cost)
+                                      for v, cost in cg.neighbours(u)),
+                                 dict(sbahn[cg.names[u]]))
+            self.assertListEqual(list(points[u]),
+                                 [float(c) for c in coordinates[cg.names[u]]])
+        node, _ = ex.uniform_cost_search(cg, 'Hauptbahnhof', ['Vaihingen'])
+        expected, _ = ex.uniform_cost_search(sbahn, 'Hauptbahnhof',
+                                             ['Vaihingen'])
+        self.assertEqual(node.path_cost, expected.path_cost)
+
+    def test_read(self):
+        cg = loader.read_edges(self.edges)
+        self.check_graph(cg, loader.read_coordinates(self.coordinates, cg))
+
+    def test_cache(self):
+        cache = os.path.join(self.directory, 'cache')
+        cg, points = loader.load_graph(self.edges, self.coordinates, cache)
+        self.check_graph(cg, points)
+        cg, points = loader.load_graph(self.edges, self.coordinates, cache)
+        self.assertIsInstance(cg.targets, np.memmap)
+        self.assertIsInstance(points, np.memmap)
+        self.check_graph(cg, points)
+
+        h = HeuristicTable.from_coordinates(cg, points, ['Vaihingen'],
+                                            sbahn_distance)
+        self.assertEqual(h.estimate(cg.index('Hauptbahnhof')),
+                         sbahn_heuristic('Hauptbahnhof', 'Vaihingen'))
+
+    def test_cache_parameters(self):
+        cache = os.path.join(self.directory, 'cache')
+        edges = os.path.join(self.directory, 'e.csv')
+        with open(edges, 'wb') as f:
+            f.write('a,b,1\nb,c,2\n')
+        cg, _ = loader.load_graph(edges, cache=cache, undirected=True)
+        self.assertEqual(cg.num_edges(), 4)
+        cg, _ = loader.load_graph(edges, cache=cache, undirected=False)
+        self.assertEqual(cg.num_edges(), 2)
+        self.assertIsInstance(cg.targets, np.ndarray)
+        self.assertNotIsInstance(cg.targets, np.memmap)
+        cg, _ = loader.load_graph(edges, cache=cache, undirected=False)
+        self.assertIsInstance(cg.targets, np.memmap)
+        self.assertEqual(cg.num_edges(), 2)
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.queries = [(start, [goal]) for start in list(sbahn)[::25]
+                        for goal in list(sbahn)[::30]]
+
+    def check_results(self, results):
+        self.assertEqual(len(results), len(self.queries))
+        for (start, goals), result in zip(self.queries, results):
+            try:
+                node, _ = ex.uniform_cost_search(sbahn, start, goals)
+            except ex.FailureException:
+                self.assertIsNone(result)
+                continue
+            cost, path = result
+            self.assertEqual(cost, node.path_cost)
+            self.assertEqual((path[0], path[-1]), (start, goals[0]))
+
+    def test_process_pool(self):
+        self.check_results(batch.run_queries(sbahn, self.queries,
+                                             processes=2, chunksize=4))
+
+    def test_same_results_in_pool(self):
+        # int names and goals that are not in the graph, 1 is also an id
+        graph = {10: {3: 1}, 3: {7: 1}, 7: {10: 1}}
+        queries = [(10, [7]), (3, [10]), (7, [99]), (10, [1]), (7, [3])]
+        expected = [(2, [10, 3, 7]), (2, [3, 7, 10]), None, None,
+                    (2, [7, 10, 3])]
+        for processes in [1, 2]:
+            self.assertListEqual(batch.run_queries(graph, queries,
+                                                   processes=processes),
+                                 expected)
+
+    def test_a_star_search(self):
+        cg = ex.CompactGraph.from_dict(sbahn)
+        self.check_results(batch.run_queries(cg, self.queries,
+                                             'a_star_search', zero_heuristic,
+                                             processes=1))
+
+
+class LandmarkHeuristicTest(unittest.TestCase):
+    def setUp(self):
+        self.h = LandmarkHeuristic.from_graph(sbahn, 8)
+        self.table = ShortestPathTable.from_graph(sbahn)
+
+    def test_admissible(self):
+        self.assertEqual(len(set(self.h.landmarks)), 8)
+        for u in list(sbahn)[::4]:
+            for v in list(sbahn)[::4]:
+                self.assertLessEqual(self.h(u, v), self.table.distance(u, v))
+
+    def test_a_star_search(self):
+        for start, goal in [('Vaihingen', 'Waiblingen'),
+                            ('Zuffenhausen', 'Flughafen/Messe'),
+                            ('Universitaet', 'Schorndorf')]:
+            ucs_stats, stats = SearchStats(), SearchStats()
+            expected, _ = ex.uniform_cost_search(sbahn, start, [goal],
+                                                 stats=ucs_stats)
+            node, _ = ex.a_star_search(sbahn, start, [goal], self.h,
+                                       stats=stats)
+            self.assertEqual(node.path_cost, expected.path_cost)
+            self.assertLess(stats.expanded * 3, ucs_stats.expanded)
+
+    def test_table(self):
+        cg = ex.CompactGraph.from_dict(sbahn)
+        h = LandmarkHeuristic.from_graph(cg, 4)
+        table = h.table(['Waiblingen'])
+        goal = cg.index('Waiblingen')
+        for u in range(len(cg)):
+            self.assertAlmostEqual(table.estimate(u), h(u, goal))
+        node, _ = ex.a_star_search(cg, 'Herrenberg', ['Waiblingen'], table)
+        self.assertEqual(node.path_cost,
+                         self.table.distance('Herrenberg', 'Waiblingen'))
+
+    def test_int_names(self):
+        # a path 0 - 1 - 2 - 3 - 4, whose ids differ from the names
+        names = [3, 0, 4, 1, 2]
+        path = OrderedDict((name, {}) for name in names)
+        for u in range(4):
+            path[u][u + 1] = path[u + 1][u] = 1
+        cg = ex.CompactGraph.from_dict(path)
+        h = LandmarkHeuristic.from_graph(cg, 2)
+        # the first landmark is the farthest state from id 0, which is 3
+        self.assertListEqual([cg.names[l] for l in h.landmarks], [0, 4])
+        for i, landmark in enumerate(h.landmarks):
+            distances, _ = dijkstra(cg, landmark, True)
+            self.assertListEqual(h.from_landmarks[:, i].tolist(),
+                                 distances.tolist())
+        table = h.table([4])
+        self.assertListEqual([table.estimate(cg.index(name))
+                              for name in range(5)], [4, 3, 2, 1, 0])
+
+    def test_directed_graph(self):
+        directed = {'A': {'B': 1}, 'B': {'C': 1}, 'C': {'A': 10}}
+        reverse = {'A': {'C': 10}, 'B': {'A': 1}, 'C': {'B': 1}}
+        h = LandmarkHeuristic.from_graph(directed, 3, reverse)
+        self.assertEqual(h('A', 'C'), 2)
+        self.assertEqual(h('C', 'B'), 11)
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_grid_graph(self):
+        graph, points = benchmark.grid_graph(100)
+        self.assertEqual(len(graph), 100)
+        self.assertEqual(graph.num_edges(), 2 * 2 * 10 * 9)
+        node, _ = ex.uniform_cost_search(graph, 0, [99], graph_search=True)
+        self.assertEqual(node.path_cost, 18)
+        self.assertListEqual(points[99].tolist(), [9, 9])
+
+    def test_random_geometric_graph(self):
+        graph, points = benchmark.random_geometric_graph(500, seed=1)
+        self.assertEqual(len(graph), 500)
+        edges = set()
+        for u in range(len(graph)):
+            for v, cost in graph.neighbours(u):
+                self.assertAlmostEqual(cost, np.linalg.norm(points[u] -
+                                                            points[v]))
+                edges.add((u, v))
+        self.assertTrue(all((v, u) in edges for u, v in edges))
+        # all close pairs are connected
+        radius = np.sqrt(8 / np.pi)
+        distances = np.sqrt(((points[:, None] - points[None]) ** 2).sum(2))
+        self.assertEqual(len(edges), (distances <= radius).sum() - 500)
+
+    def test_run_benchmark(self):
+        results = benchmark.run_benchmark(
+            ['grid', 'geometric'], [400], ['uniform_cost_search',
+                                           'a_star_search'],
+            ['euclidean', 'landmarks'], queries=2, landmarks=2)
+        self.assertEqual(len(results), 2 * 2 * (1 + 2))
+        for result in results:
+            expected = [r for r in results if r['algorithm'] ==
+                        'uniform_cost_search' and r['graph'] ==
+                        result['graph'] and r['query'] == result['query']][0]
+            self.assertEqual(result['status'], expected['status'])
+            if result['status'] == 'found':
+                self.assertAlmostEqual(result['cost'], expected['cost'])
+                self.assertLessEqual(result['expanded'], expected['expanded'])
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'results.json')
+            benchmark.write_results(filename, results, 'test')
+            document = benchmark.read_results(filename)
+            self.assertEqual(document['label'], 'test')
+            self.assertEqual(len(document['results']), len(results))
+            comparison = benchmark.compare(document, document)
+            self.assertEqual(len(comparison), 2 * 3)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_budget(self):
+        graph, points = benchmark.grid_graph(400)
+        result = benchmark.measure('uniform_cost_search', graph, 0, 399,
+                                   None, max_expansions=10)
+        self.assertEqual(result['status'], 'budget')
+        self.assertEqual(result['expanded'], 11)
+        result = benchmark.measure('sma_star_search', graph, 0, 399,
+                                   benchmark.zero_heuristic, max_seconds=0.1)
+        self.assertEqual(result['status'], 'budget')
+        self.assertLess(result['seconds'], 1)
+
+    def test_measure_in_process(self):
+        graph, points = benchmark.grid_graph(400)
+        # a peak of this process before does not count for the child
+        ballast = [0] * (100 * 1000 * 1000 // 8)
+        del ballast
+        result = benchmark.measure_in_process('uniform_cost_search', graph, 0,
+                                              399, None)
+        expected = benchmark.measure('uniform_cost_search', graph, 0, 399,
+                                     None)
+        self.assertEqual(result['status'], 'found')
+        self.assertEqual(result['cost'], expected['cost'])
+        self.assertEqual(result['expanded'], expected['expanded'])
+        self.assertLess(result['max_rss'] + 50 * 1000, expected['max_rss'])
+
+
+class LifelongPlannerTest(unittest.TestCase):
+    def test_small_graph(self):
+        planner = LifelongPlanner(graph, 'D', 'C')
+        check_path(self, ['C', 'A', 'D'], planner.plan())
+        planner.update_edge('A', 'C', 50)
+        check_path(self, ['C', 'B', 'A', 'D'], planner.plan())
+
+    def test_random_updates(self):
+        random.seed(4)
+        g = copy.deepcopy(sbahn)
+        planner = LifelongPlanner(g, 'Vaihingen', 'Waiblingen')
+        edges = [(u, v) for u in g for v in g[u] if u < v]
+        incremental, cold = 0, 0
+        for _ in range(60):
+            u, v = random.choice(edges)
+            cost = random.choice([g[u][v] + random.randint(1, 10),
+                                  max(0, g[u][v] - 2), float('inf')])
+            if cost == float('inf'):
+                del g[u][v], g[v][u]
+                edges.remove((u, v))
+            else:
+                g[u][v] = g[v][u] = cost
+            planner.update_edge(u, v, cost)
+            planner.update_edge(v, u, cost)
+
+            stats, cold_stats = SearchStats(), SearchStats()
+            try:
+                expected, _ = ex.uniform_cost_search(
+                    g, 'Vaihingen', ['Waiblingen'], graph_search=True,
+                    stats=cold_stats)
+            except ex.FailureException:
+                self.assertRaises(ex.FailureException, planner.plan)
+                continue
+            node = planner.plan(stats=stats)
+            self.assertEqual(node.path_cost, expected.path_cost)
+            path = node.path()
+            self.assertEqual(node.path_cost, sum(g[a][b] for a, b in
+                                                 zip(path, path[1:])))
+            incremental += stats.expanded
+            cold += cold_stats.expanded
+        self.assertLess(incremental * 5, cold)
+
+    def test_single_delay(self):
+        cg = ex.CompactGraph.from_dict(sbahn)
+        planner = LifelongPlanner(cg, 'Vaihingen', 'Waiblingen',
+                                  zero_heuristic)
+        cold = SearchStats()
+        path = cg.path(planner.plan(stats=cold))
+        u, v = path[len(path) // 2], path[len(path) // 2 + 1]
+        planner.update_edge(cg.index(u), cg.index(v), 30)
+        planner.update_edge(cg.index(v), cg.index(u), 30)
+        stats = SearchStats()
+        node = planner.plan(stats=stats)
+
+        g = copy.deepcopy(sbahn)
+        g[u][v] = g[v][u] = 30
+        expected, _ = ex.uniform_cost_search(g, 'Vaihingen', ['Waiblingen'])
+        self.assertEqual(node.path_cost, expected.path_cost)
+        self.assertLess(stats.expanded, cold.expanded)
+
+    def test_unreachable(self):
+        g = copy.deepcopy(sbahn)
+        planner = LifelongPlanner(g, 'Vaihingen', 'Waiblingen')
+        for u in g['Waiblingen']:
+            planner.update_edge(u, 'Waiblingen', float('inf'))
+        self.assertRaises(ex.FailureException, planner.plan)
+        planner.update_edge('Fellbach', 'Waiblingen', 3)
+        self.assertEqual(planner.plan().path()[-2:],
+                         ['Fellbach', 'Waiblingen'])
+
+
+class CompactGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.graph = ex.CompactGraph.from_dict(graph)
+        self.sbahn = ex.CompactGraph.from_dict(sbahn)
+
+    def test_from_dict(self):
+        self.assertEqual(len(self.sbahn), len(sbahn))
+        self.assertEqual(self.sbahn.num_edges(),
+                         sum(len(sbahn[s]) for s in sbahn))
+        for state in sbahn:
+            u = self.sbahn.index(state)
+            self.assertEqual(self.sbahn.names[u], state)
+            self.assertListEqual(
+                [(self.sbahn.names[v], cost)
+                 for v, cost in self.sbahn.neighbours(u)],
+                list(sbahn[state].items()))
+
+    def test_expand(self):
+        n = ex.Node(self.graph.index('A'), None, 0, 0)
+        childs = ex.expand(n, self.graph)
+        self.assertListEqual([self.graph.names[s.state] for s in childs],
+                             ['B', 'C', 'D'])
+        self.assertListEqual([s.path_cost for s in childs], [20, 30, 25])
+
+    def test_unvalid_goal(self):
+        with self.assertRaises(ex.UnvalidGoalException):
+            ex.breadth_first_search(self.sbahn, 'Zuffenhausen', ['Nowhere'])
+
+    def test_int_names(self):
+        # the ids 0, 1, 2 belong to the names 10, 3, 7
+        cycle = {10: {3: 1}, 3: {7: 1}, 7: {10: 1}}
+        cg = ex.CompactGraph.from_dict(cycle)
+        self.assertListEqual(cg.names, [10, 3, 7])
+        self.assertNotIn(1, cg)
+        self.assertIn(10, cg)
+        self.assertRaises(KeyError, cg.index, 1)
+        self.assertEqual(cg.check_id(1), 1)
+        self.assertRaises(KeyError, cg.check_id, 3)
+        for g in [cycle, cg]:
+            with self.assertRaises(ex.UnvalidGoalException):
+                ex.uniform_cost_search(g, 10, [1])
+        node, _ = ex.uniform_cost_search(cg, 10, [7])
+        self.assertListEqual(cg.path(node), [10, 3, 7])
+
+    def test_breadth_first_search(self):
+        node, fringe = ex.breadth_first_search(self.sbahn, 'Zuffenhausen',
+                                                ['Universitaet'])
+        self.assertListEqual(self.sbahn.path(node),
+                             ['Zuffenhausen', 'Feuerbach', 'Nordbahnhof',
+                              'Hauptbahnhof', 'Stadtmitte', 'Feuersee',
+                              'Schwabstrasse', 'Universitaet'])
+
+    def test_uniform_cost_search(self):
+        node, fringe = ex.uniform_cost_search(self.sbahn, 'Hauptbahnhof',
+                                               ['Vaihingen'])
+        expected, _ = ex.uniform_cost_search(sbahn, 'Hauptbahnhof',
+                                              ['Vaihingen'])
+        self.assertListEqual(self.sbahn.path(node),
+                             ['Hauptbahnhof', 'Stadtmitte', 'Feuersee',
+                              'Schwabstrasse', 'Universitaet', 'Oesterfeld',
+                              'Vaihingen'])
+        self.assertEqual(node.path_cost, expected.path_cost)
+
+    def test_a_star_search(self):
+        names = self.sbahn.names
+        node, fringe = ex.a_star_search(
+            self.sbahn, 'Zuffenhausen',
+            ['Universitaet', 'Schwabstrasse', 'Vaihingen'],
+            lambda u, v: sbahn_heuristic(names[u], names[v]))
+        self.assertListEqual(self.sbahn.path(node),
+                             ['Zuffenhausen', 'Feuerbach', 'Nordbahnhof',
+                              'Hauptbahnhof', 'Stadtmitte', 'Feuersee',
+                              'Schwabstrasse'])
@@ -0,0 +1,197 @@
+import argparse
+import itertools
+import multiprocessing
+import sys
+import time
+import numpy as np
+import ex_csp as ex
+from csp import BitsetCSP
+from exact_cover import sudoku_cover
+
+# the characters of a puzzle, '0' and '.' are empty cells
+CELLS = '0123456789.'
+# the variable selections of the solver
+SELECTIONS = {'first': ex.first_unassigned,
+              'mrv': ex.minimum_remaining,
+              'mrv_degree': ex.minimum_remaining_with_degree}
+PROPAGATIONS = ['ac_3', 'forward_checking', 'none']
+SOLVERS = ['exact_cover', 'csp']
+
+
+def read_puzzles(lines):
+    """
+    Reads sudokus lazily from lines, so that files of any size can be
+    solved. A puzzle is either written in one line of 81 cells, or in
+    9 lines of 9 cells after a header like "Grid 01" as in sudoku.txt.
+    Blank lines are skipped.
+    :param lines: An iterable of str, e.g. an open file
+    :return: A generator of (name, puzzle) tuples, where the name is the
+             header or the number of the puzzle and puzzle is a str of 81
+             digits
+    """
+    name, cells, number = None, [], 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.strip(CELLS):
+            # a header
+            if cells:
+                raise ValueError("incomplete sudoku {}".format(name))
+            name = line
+            continue
+        cells.extend(line)
+        if len(cells) > 81:
+            raise ValueError("sudoku {} has more than 81 cells".format(name))
+        if len(cells) == 81:
+            number += 1
+            yield (name or str(number),
+                   ''.join(cells).replace('.', '0'))
+            name, cells = None, []
+    if cells:
+        raise ValueError("incomplete sudoku {}".format(name))
+
+
+def solve_puzzle(puzzle, select='mrv_degree', propagation='ac_3',
+                 solver='exact_cover'):
+    """
+    Solves a sudoku with the exact cover solver or the CSP solver from
+    ex_csp.
+    :param puzzle: A str of 81 digits, 0 for empty cells
+    :param select: A key of SELECTIONS, only for the CSP solver
+    :param propagation: One of PROPAGATIONS, only for the CSP solver
+    :param solver: One of SOLVERS
+    :return: A tuple of the solution as str of 81 digits or None if there
+             is none, the number of nodes and the time in seconds
+    """
+    start = time.time()
+    sudoku = np.array([int(c) for c in puzzle]).reshape((9, 9))
+    solution = None
+    if solver == 'exact_cover':
+        cover, candidates = sudoku_cover(sudoku)
+        rows = cover.solve()
+        if rows is not None:
+            cells = list(puzzle)
+            for i in rows:
+                r, c, value = candidates[i]
+                cells[r * 9 + c] = str(value)
+            solution = ''.join(cells)
+        return solution, cover.nodes, time.time() - start
+
+    problem = BitsetCSP(ex.create_sudoku_csp(sudoku))
+    solved = ex.bitset_solve(problem, SELECTIONS[select],
+                             propagation == 'ac_3',
+                             propagation == 'forward_checking')
+    if solved:
+        solution = ''.join(str(problem.values[k])
+                           for k in problem.assignment)
+    return solution, problem.nodes, time.time() - start
+
+
+def solve_task(task):
+    """
+    solve_puzzle() for one task of solve_puzzles(). It is a module level
+    function, so that it can be sent to the worker processes.
+    :param task: A tuple of name, puzzle, select, propagation and solver
+    :return: A tuple of name, puzzle, solution, nodes and seconds
+    """
+    name, puzzle = task[:2]
+    return (name, puzzle) + solve_puzzle(puzzle, *task[2:])
+
+
+def solve_puzzles(puzzles, processes=None, chunksize=32, select='mrv_degree',
+                  propagation='ac_3', solver='exact_cover'):
+    """
+    Solves the puzzles in a pool of processes. The puzzles are taken in
+    slices, so only a few thousand of them are in memory at once.
+    :param puzzles: An iterable of (name, puzzle) tuples like from
+                    read_puzzles()
+    :param processes: The number of processes, all CPUs if None. With 1
+                      the puzzles are solved in this process
+    :param chunksize: The number of puzzles that are sent to a process
+                      at once
+    :return: A generator of (name, puzzle, solution, nodes, seconds)
+             tuples in the order of the puzzles
+    """
+    tasks = ((name, puzzle, select, propagation, solver)
+             for name, puzzle in puzzles)
+    if processes == 1:
+        for task in tasks:
+            yield solve_task(task)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        size = chunksize * (processes or multiprocessing.cpu_count()) * 8
+        while True:
+            batch = list(itertools.islice(tasks, size))
+            if not batch:
+                break
+            for result in pool.imap(solve_task, batch, chunksize):
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def write_results(results, output):
+    """
+    Writes the results of solve_puzzles() as tab separated lines of name,
+    solution (or "-" if there is none), nodes and seconds.
+    :param results: An iterable of result tuples
+    :param output: A file object
+    :return: A tuple of the number of puzzles, unsolvable puzzles and
+             nodes
+    """
+    puzzles, unsolved, nodes = 0, 0, 0
+    output.write("name\tsolution\tnodes\tseconds\n")
+    for name, puzzle, solution, count, seconds in results:
+        puzzles += 1
+        nodes += count
+        if solution is None:
+            unsolved += 1
+        output.write("{}\t{}\t{}\t{:.6f}\n".format(name, solution or '-',
+                                                   count, seconds))
+    return puzzles, unsolved, nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solves a file of sudokus in a pool of processes")
+    parser.add_argument('input', nargs='?', default='sudoku.txt',
+                        help="one puzzle per line or the format of "
+                             "sudoku.txt, - for stdin")
+    parser.add_argument('--output', default='-',
+                        help="the file for the results, - for stdout")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=32)
+    parser.add_argument('--solver', default='exact_cover', choices=SOLVERS)
+    parser.add_argument('--select', default='mrv_degree',
+                        choices=sorted(SELECTIONS))
+    parser.add_argument('--propagation', default='ac_3',
+                        choices=PROPAGATIONS)
+    args = parser.parse_args()
+
+    lines = sys.stdin if args.input == '-' else open(args.input)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.time()
+    try:
+        results = solve_puzzles(read_puzzles(lines), args.processes,
+                                args.chunksize, args.select,
+                                args.propagation, args.solver)
+        puzzles, unsolved, nodes = write_results(results, output)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if output is not sys.stdout:
+            output.close()
+    seconds = time.time() - start
+    sys.stderr.write("{} puzzles ({} unsolvable), {} nodes in {:.3f}s, "
+                     "{:.1f} puzzles/s\n".format(
+                         puzzles, unsolved, nodes, seconds,
+                         puzzles / seconds if seconds > 0 else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 __author__ = 'johannes'
 
+import heapq
+from collections import deque, OrderedDict
+
 
 class Variable(object):
     """
@@ -93,16 +96,67 @@ class ConstrainedSatisfactionProblem(object):
         """
         The constructor of a CSP. It automatically generates the peers
         member for each variable, i.e. the list of other variables that
-        have a common constraint with a variable.
+        have a common constraint with a variable. It also indexes the
+        constraints by the names of their variables. The constraints are
+        added with add_constraint(), so a second constraint between the
+        same variables is skipped.
         :param variables:
         :param constraints:
         :return:
         """
         self.variables = variables
-        self.constraints = constraints
+        self.constraints = []
+        # the constraints of each variable name
+        self.constraints_by_variable = dict((var.name, [])
+                                            for var in variables)
+        # (name, name) with the smaller name first for each constraint
+        self.pairs = set()
         for c in constraints:
-            c.var1.peers.append(c.var2)
-            c.var2.peers.append(c.var1)
+            self.add_constraint(c)
+
+    @staticmethod
+    def pair(var1, var2):
+        """
+        Returns the canonical pair of the names of two variables, which is
+        the same for both orders.
+        :return: A tuple of two str
+        """
+        if var1.name < var2.name:
+            return var1.name, var2.name
+        return var2.name, var1.name
+
+    def index_constraint(self, c):
+        """
+        Adds a constraint to the peers of its variables, to
+        constraints_by_variable and to pairs.
+        :param c: An UnequalConstraint
+        """
+        var1, var2 = c.var1, c.var2
+        var1.peers.append(var2)
+        var2.peers.append(var1)
+        self.constraints_by_variable.setdefault(var1.name, []).append(c)
+        self.constraints_by_variable.setdefault(var2.name, []).append(c)
+        self.pairs.add(self.pair(var1, var2))
+
+    def has_constraint(self, var1, var2):
+        """
+        Test whether there is a constraint between two variables.
+        :return: A bool
+        """
+        return self.pair(var1, var2) in self.pairs
+
+    def add_constraint(self, constraint):
+        """
+        Adds a constraint unless there is already one between its
+        variables.
+        :param constraint: An UnequalConstraint
+        :return: True if the constraint was added
+        """
+        if self.has_constraint(constraint.var1, constraint.var2):
+            return False
+        self.index_constraint(constraint)
+        self.constraints.append(constraint)
+        return True
 
     def complete(self):
         """
@@ -124,8 +178,7 @@ class ConstrainedSatisfactionProblem(object):
         :param var: A variable
         :return: A list of UnequalConstraints
         """
-        return (constraint for constraint in self.constraints
-                if var.name in [constraint.var1.name, constraint.var2.name])
+        return iter(self.constraints_by_variable.get(var.name, []))
 
     def __str__(self):
         """
@@ -139,3 +192,351 @@ class ConstrainedSatisfactionProblem(object):
         for constraint in self.constraints:
             _str += "    {}\n".format(str(constraint))
         return _str
+
+
+class BitsetCSP(object):
+    """
+    A faster representation of a ConstrainedSatisfactionProblem for the
+    solvers. The values are numbered and a domain is an int, whose bit k
+    is set if the k-th value is in the domain. The constraints are stored
+    as a list of neighbour indices per variable, so after an assignment
+    only the constraints of the assigned variable have to be checked
+    instead of all constraints.
+
+    For every variable the number of assigned neighbours per value and
+    the number of unassigned neighbours are updated with each assignment,
+    so the legal values and the degree of a variable are known without
+    testing its values.
+    """
+    def __init__(self, problem):
+        """
+        The constructor of a BitsetCSP. The current values of the variables
+        are taken as assignment.
+        :param problem: A ConstrainedSatisfactionProblem
+        """
+        self.problem = problem
+        self.variables = problem.variables
+        # the k-th bit of a domain stands for values[k]
+        self.values = []
+        self.bits = {}
+        self.index = dict((var, i) for i, var in enumerate(self.variables))
+        # the bits of each domain in the order of its list
+        self.orders = []
+        self.domains = []
+        for var in self.variables:
+            order = []
+            for value in var.domain:
+                if value not in self.bits:
+                    self.bits[value] = len(self.values)
+                    self.values.append(value)
+                order.append(self.bits[value])
+            self.orders.append(order)
+            self.domains.append(sum(1 << k for k in set(order)))
+
+        neighbours = [set() for _ in self.variables]
+        for c in problem.constraints:
+            i, j = self.index[c.var1], self.index[c.var2]
+            neighbours[i].add(j)
+            neighbours[j].add(i)
+        self.neighbours = [sorted(n) for n in neighbours]
+
+        # the bit of the value of each variable or None
+        self.assignment = [None if var.value is None else self.bits[var.value]
+                           for var in self.variables]
+        self.unassigned = self.assignment.count(None)
+        # counts[i][k] is the number of neighbours of i assigned to value k,
+        # taken[i] has the bits of these values
+        self.counts = [[0] * len(self.values) for _ in self.variables]
+        self.taken = [0] * len(self.variables)
+        # the number of unassigned neighbours
+        self.degrees = [len(n) for n in self.neighbours]
+        # a heap of (legal values, -degree, index) for minimum_remaining(),
+        # built by its first call
+        self.heap = None
+        self.heap_degree = False
+        for i, k in enumerate(self.assignment):
+            if k is not None:
+                self.update_neighbours(i, k, 1)
+        # the number of assignments made, i.e. the nodes of the search
+        self.nodes = 0
+        # (variable, old domain) for every domain change, see undo()
+        self.trail = []
+
+    def consistent(self, i=None, k=None):
+        """
+        Tests whether the value with bit k can be assigned to variable i,
+        i.e. no neighbour of i has this value. Without arguments the whole
+        assignment is tested.
+        :param i: The index of a variable or None
+        :param k: The bit of a value
+        :return: A bool
+        """
+        if i is None:
+            return all(self.consistent(i, k)
+                       for i, k in enumerate(self.assignment) if k is not None)
+        return not self.taken[i] >> k & 1
+
+    def legal_values(self, i):
+        """
+        Returns the domain of variable i without the values of its
+        assigned neighbours.
+        :param i: The index of a variable
+        :return: A bitmask
+        """
+        return self.domains[i] & ~self.taken[i]
+
+    def update_neighbours(self, i, k, change):
+        """
+        Updates the counts of value k and the degrees of all neighbours of
+        variable i, when i is assigned (change is 1) or unassigned (change
+        is -1).
+        """
+        bit = 1 << k
+        counts, taken, degrees = self.counts, self.taken, self.degrees
+        neighbours = self.neighbours[i]
+        if change > 0:
+            for j in neighbours:
+                counts[j][k] += 1
+                taken[j] |= bit
+                degrees[j] -= 1
+        else:
+            for j in neighbours:
+                count = counts[j]
+                count[k] -= 1
+                if not count[k]:
+                    taken[j] &= ~bit
+                degrees[j] += 1
+        if self.heap is not None:
+            for j in neighbours:
+                self.push(j)
+
+    def assign(self, i, k):
+        if self.assignment[i] is not None:
+            self.unassign(i)
+        self.unassigned -= 1
+        self.assignment[i] = k
+        self.update_neighbours(i, k, 1)
+        self.nodes += 1
+
+    def unassign(self, i):
+        k = self.assignment[i]
+        if k is not None:
+            self.unassigned += 1
+            self.assignment[i] = None
+            self.update_neighbours(i, k, -1)
+            if self.heap is not None:
+                self.push(i)
+
+    def key(self, i):
+        """
+        The heap key of variable i, the first of the unassigned variables
+        with the smallest key is chosen by minimum_remaining().
+        """
+        remaining = popcount(self.domains[i] & ~self.taken[i])
+        if self.heap_degree:
+            return remaining, -self.degrees[i], i
+        return remaining, i
+
+    def push(self, i):
+        if self.assignment[i] is None:
+            heapq.heappush(self.heap, self.key(i))
+
+    def minimum_remaining(self, degree=False):
+        """
+        Returns the first unassigned variable with the fewest legal values,
+        with degree the one with most unassigned neighbours of these. The
+        variables are kept in a heap and every change of a count pushes
+        the new key, the outdated keys are skipped here.
+        :param degree: Use the degree heuristic as tie-breaker
+        :return: The index of the variable or None if all are assigned
+        """
+        if self.heap is None or self.heap_degree != degree or \
+                len(self.heap) > 8 * len(self.variables) + 64:
+            # (re)build the heap, also to drop the outdated keys
+            self.heap_degree = degree
+            self.heap = [self.key(i) for i, k in enumerate(self.assignment)
+                         if k is None]
+            heapq.heapify(self.heap)
+        heap = self.heap
+        while heap:
+            i = heap[0][-1]
+            if self.assignment[i] is None and heap[0] == self.key(i):
+                return i
+            heapq.heappop(heap)
+        return None
+
+    def restrict(self, i, domain):
+        """
+        Replaces the domain of variable i and remembers the old one on the
+        trail.
+        :param i: The index of a variable
+        :param domain: The new domain, a bitmask
+        """
+        if self.domains[i] != domain:
+            self.trail.append((i, self.domains[i]))
+            self.domains[i] = domain
+            if self.heap is not None:
+                self.push(i)
+
+    def undo(self, mark):
+        """
+        Restores the domains that were changed since the trail had length
+        mark. This is cheaper than copying all domains before an
+        assignment, because only the changes are stored.
+        :param mark: A former len(self.trail)
+        """
+        trail, domains = self.trail, self.domains
+        while len(trail) > mark:
+            i, domain = trail.pop()
+            domains[i] = domain
+            if self.heap is not None:
+                self.push(i)
+
+    def forward_check(self, i):
+        """
+        Reduces the domain of the assigned variable i to its value and
+        removes the value from the domains of its unassigned neighbours.
+        :param i: The index of an assigned variable
+        :return: False if a domain became empty, otherwise True
+        """
+        bit = 1 << self.assignment[i]
+        self.restrict(i, bit)
+        for j in self.neighbours[i]:
+            if self.assignment[j] is None and self.domains[j] & bit:
+                self.restrict(j, self.domains[j] & ~bit)
+                if not self.domains[j]:
+                    return False
+        return True
+
+    def ac_3(self, changed=None):
+        """
+        The AC-3 algorithm. An arc (h, i) is revised by removing the values
+        from the domain of h which have no consistent value in the domain
+        of i. For an UnequalConstraint this is only the case if i has a
+        single value left, so instead of arcs the variables whose domains
+        changed are queued and all arcs towards one are revised at once.
+        :param changed: The indices of the variables whose domains
+                        changed. None for all variables
+        :return: False if a domain became empty, otherwise True
+        """
+        domains, neighbours = self.domains, self.neighbours
+        if changed is None:
+            changed = range(len(domains))
+        queue = deque(changed)
+        queued = set(changed)
+        while queue:
+            i = queue.popleft()
+            queued.discard(i)
+            domain = domains[i]
+            if not domain:
+                return False
+            if domain & (domain - 1):
+                continue
+            for h in neighbours[i]:
+                if domains[h] & domain:
+                    self.restrict(h, domains[h] & ~domain)
+                    if not domains[h]:
+                        return False
+                    if h not in queued:
+                        queue.append(h)
+                        queued.add(h)
+        return True
+
+    def complete(self):
+        """
+        Test whether all variables are assigned and all constraints are
+        satisfied.
+        :return: A bool
+        """
+        return self.unassigned == 0 and self.consistent()
+
+    def write_back(self):
+        """
+        Sets the values of the variables of the original problem to the
+        current assignment.
+        :return: The original ConstrainedSatisfactionProblem
+        """
+        for var, k in zip(self.variables, self.assignment):
+            if k is None:
+                var.value = None
+            elif var.value is None or self.bits[var.value] != k:
+                var.value = self.values[k]
+        return self.problem
+
+
+class NogoodStore(object):
+    """
+    A bounded store of nogoods for a BitsetCSP. A nogood is a partial
+    assignment, a frozenset of (variable, value bit) literals, that can
+    not be extended to a solution. The nogoods are indexed by their
+    literals, so that only the nogoods of a new assignment are tested.
+    If the store is full, the nogood that was least recently added or
+    used is evicted.
+    """
+    def __init__(self, max_size=1000, max_length=None):
+        """
+        The constructor of a NogoodStore.
+        :param max_size: The maximum number of nogoods
+        :param max_length: Longer nogoods are not stored, None for no
+                           limit
+        """
+        self.max_size = max_size
+        self.max_length = max_length
+        # the nogoods from the least to the most recently used
+        self.nogoods = OrderedDict()
+        # the nogoods of each literal
+        self.watches = {}
+        self.evicted = 0
+
+    def add(self, literals):
+        """
+        Stores a nogood.
+        :param literals: An iterable of (variable, value bit) tuples
+        """
+        nogood = frozenset(literals)
+        if not nogood or self.max_length is not None and \
+                len(nogood) > self.max_length:
+            return
+        if nogood in self.nogoods:
+            del self.nogoods[nogood]
+            self.nogoods[nogood] = None
+            return
+        self.nogoods[nogood] = None
+        for literal in nogood:
+            self.watches.setdefault(literal, set()).add(nogood)
+        while len(self.nogoods) > self.max_size:
+            old, _ = self.nogoods.popitem(last=False)
+            for literal in old:
+                self.watches[literal].discard(old)
+            self.evicted += 1
+
+    def violated(self, i, k, assignment):
+        """
+        Tests whether assigning the value with bit k to variable i
+        completes a nogood.
+        :param i: The index of an unassigned variable
+        :param k: The bit of a value
+        :param assignment: The assignment of a BitsetCSP
+        :return: The other variables of the nogood or None
+        """
+        for nogood in self.watches.get((i, k), ()):
+            for j, v in nogood:
+                if assignment[j] != v and j != i:
+                    break
+            else:
+                del self.nogoods[nogood]
+                self.nogoods[nogood] = None
+                return [j for j, v in nogood if j != i]
+        return None
+
+    def __len__(self):
+        return len(self.nogoods)
+
+
+def popcount(mask):
+    """
+    Returns the number of values in a bitmask domain.
+    :param mask: An int
+    :return: An int
+    """
+    return bin(mask).count('1')
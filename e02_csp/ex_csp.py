@@ -6,11 +6,12 @@ reference!
 """
 import numpy as np
 import csp
+from csp import BitsetCSP, NogoodStore
 from data import create_map_csp
 import itertools
 
 
-def backtracking(csp, ac_3=False):
+def backtracking(csp, ac_3=False, forward_checking=False):
     """
     Basic backtracking algorithm to solve a CSP.
 
@@ -19,30 +20,22 @@ def backtracking(csp, ac_3=False):
               AC-3!
     :param csp: A csp.ConstrainedSatisfactionProblem object
                 representing the CSP to solve
+    :param ac_3: Maintain arc consistency with AC-3 after each assignment
+    :param forward_checking: Only remove the assigned value from the
+                             domains of the neighbours, which is cheaper
+                             than AC-3. Ignored if ac_3 is True
     :return: A csp.ConstrainedSatisfactionProblem, where all Variables
              are set and csp.complete() returns True. (I.e. the solved
              CSP)
     """
-    
-    if csp.complete():
-        return csp
-    
-    for variable in csp.variables:
-        if variable.value is None: #select next unassigned variable
-            var = variable
-            break
-            
-    for value in var.domain:
-        var.value = value
-        if csp.consistent():
-            result = backtracking(csp)
-            if result is not False:
-                return result
-        var.value = None
-    return False
-    
+    problem = BitsetCSP(csp)
+    if not bitset_solve(problem, first_unassigned, ac_3, forward_checking):
+        return False
+    return problem.write_back()
 
-def minimum_remaining_values(csp, order = [], ac_3=False):
+
+def minimum_remaining_values(csp, order=None, ac_3=False,
+                             forward_checking=False):
     """
     Implement the basic backtracking algorithm to solve a CSP with
     minimum remaining values heuristic and no tie-breaker. Thus the
@@ -53,55 +46,20 @@ def minimum_remaining_values(csp, order = [], ac_3=False):
               AC-3!
     :param csp: A csp.ConstrainedSatisfactionProblem object
                 representing the CSP to solve
+    :param order: An optional list the assigned variables are appended to
+    :param ac_3: Maintain arc consistency with AC-3 after each assignment
+    :param forward_checking: Use forward checking instead, if not ac_3
     :return: A tuple of 1) a csp.ConstrainedSatisfactionProblem, where
              all Variables are set and csp.complete() returns True. (I.e.
              the solved CSP) and 2) a list of all variables in the order
              they have been assigned.
     """
-    if csp.complete():
-        return csp, order
+    return solve_in_order(csp, order, minimum_remaining, ac_3,
+                          forward_checking)
 
-    unassigned = []
-    for variable in csp.variables:
-        if variable.value is None: 
-            unassigned.append(variable) #store all unassigned variables
-    
-    counter = {}  #stores all unassigned variables with legal values
-    for variable in unassigned:
-        counter[variable.name] = 0
-        for value in variable.domain:
-            variable.value = value
-            if csp.consistent(): #increases the number of legal values of the variable
-                counter[variable.name] += 1
-            variable.value = None
-         
-    i = 0
-    while i < len(unassigned):
-        var = unassigned[i]
-        legal = counter[var.name]
-        for key in counter:
-            if counter[key] < legal:
-                nothingSmaller = False
-                i += 1
-                break
-            else: 
-                nothingSmaller = True
-        if nothingSmaller:
-            break
-
-    for value in var.domain:
-        var.value = value
-        order.append(var)
-        if csp.consistent():
-            result = minimum_remaining_values(csp, order)
-            if result is not False:
-                return result
-        var.value = None
-        order.remove(var)
-    return False
-    
 
-def minimum_remaining_values_with_degree(csp, order = [], ac_3=False):
+def minimum_remaining_values_with_degree(csp, order=None, ac_3=False,
+                                         forward_checking=False):
     """
     Implement the basic backtracking algorithm to solve a CSP with
     minimum remaining values heuristic and the degree heuristic as
@@ -112,62 +70,209 @@ def minimum_remaining_values_with_degree(csp, order = [], ac_3=False):
               AC-3!
     :param csp: A csp.ConstrainedSatisfactionProblem object
                 representing the CSP to solve
+    :param order: An optional list the assigned variables are appended to
+    :param ac_3: Maintain arc consistency with AC-3 after each assignment
+    :param forward_checking: Use forward checking instead, if not ac_3
     :return: A tuple of 1) a csp.ConstrainedSatisfactionProblem, where
              all Variables are set and csp.complete() returns True. (I.e.
              the solved CSP) and 2) a list of all variables in the order
              they have been assigned.
     """
-    if csp.complete():
-        return csp, order
+    return solve_in_order(csp, order, minimum_remaining_with_degree, ac_3,
+                          forward_checking)
 
-    unassigned = []
-    for variable in csp.variables:
-        if variable.value is None: 
-            unassigned.append(variable) #stores all unassigned variables
-    
-    counter = {} #stores tuple of legal values and number of constraints on remainung variables
-    for variable in unassigned:
-        counter[variable.name] = [0, 0]
-        for value in variable.domain:
-            variable.value = value
-            if csp.consistent(): #increases the number of legal values of the variable
-                counter[variable.name][0] += 1
-            variable.value = None
-        for peer in variable.peers:
-            if peer.value is None:
-                counter[variable.name][1] += 1 #sets number of constraints on remaining variables
-        
-    i = 0
-    while i < len(unassigned):
-        var = unassigned[i]
-        legal, remainConstr = counter[var.name]
-        for key in counter:
-            if counter[key][0] < legal:
-                i += 1
-                nothingBetter = False
-                break
-            elif counter[key][0] == legal:
-                if counter[key][1] > remainConstr:
-                    i += 1
-                    nothingBetter = False
-                    break
-                else: nothingBetter = True
-            else: nothingBetter = True
-        if nothingBetter:
-            break
-
-    for value in var.domain:
-        var.value = value
-        order.append(var)
-        if csp.consistent():
-            result = minimum_remaining_values_with_degree(csp, order)
-            if result is not False:
-                return result
-        var.value = None
-        order.remove(var)
+
+def solve_in_order(csp, order, select, ac_3, forward_checking):
+    """
+    Solves a CSP like the heuristic searches above.
+    :return: A tuple of the solved CSP and the list of the variables in
+             the order they have been assigned or False
+    """
+    if order is None:
+        order = []
+    problem = BitsetCSP(csp)
+    indices = []
+    if not bitset_solve(problem, select, ac_3, forward_checking, indices):
+        return False
+    order.extend(problem.variables[i] for i in indices)
+    return problem.write_back(), order
+
+
+def first_unassigned(problem):
+    """
+    Selects the first unassigned variable of a csp.BitsetCSP.
+    :return: The index of the variable
+    """
+    return problem.assignment.index(None)
+
+
+def minimum_remaining(problem):
+    """
+    Selects the first of the unassigned variables with the fewest legal
+    values.
+    :return: The index of the variable
+    """
+    return problem.minimum_remaining()
+
+
+def minimum_remaining_with_degree(problem):
+    """
+    Selects the first of the unassigned variables with the fewest legal
+    values and of these the one with the most unassigned neighbours.
+    :return: The index of the variable
+    """
+    return problem.minimum_remaining(degree=True)
+
+
+def bitset_solve(problem, select=None, ac_3=False, forward_checking=False,
+                 order=None):
+    """
+    Checks the current assignment of a csp.BitsetCSP, makes the domains
+    consistent with it if a kind of propagation is chosen and then
+    searches with bitset_backtracking().
+    :return: True if all variables could be assigned, otherwise False
+    """
+    if not problem.consistent():
+        return False
+    if ac_3 or forward_checking:
+        assigned = [i for i, k in enumerate(problem.assignment)
+                    if k is not None]
+        for i in assigned:
+            problem.restrict(i, 1 << problem.assignment[i])
+        if ac_3 and not problem.ac_3():
+            return False
+        if not ac_3 and not all(problem.forward_check(i) for i in assigned):
+            return False
+    return bitset_backtracking(problem, select, ac_3, forward_checking,
+                               order)
+
+
+def bitset_backtracking(problem, select=None, ac_3=False,
+                        forward_checking=False, order=None):
+    """
+    The search of the solvers above on a csp.BitsetCSP. After an
+    assignment only the constraints of the assigned variable are checked.
+    Domains reduced by AC-3 or forward checking are restored from the
+    trail of the problem when the search backtracks.
+    :param problem: A csp.BitsetCSP
+    :param select: A function that returns the index of the next variable,
+                   first_unassigned if None
+    :param ac_3: Maintain arc consistency with AC-3 after each assignment
+    :param forward_checking: Use forward checking instead, if not ac_3
+    :param order: An optional list the indices of the assigned variables
+                  are appended to
+    :return: True if all variables could be assigned, otherwise False
+    """
+    if problem.unassigned == 0:
+        return True
+
+    i = (select or first_unassigned)(problem)
+    legal = problem.legal_values(i)
+    for k in problem.orders[i]:
+        if not legal >> k & 1:
+            continue
+        mark = len(problem.trail)
+        problem.assign(i, k)
+        if order is not None:
+            order.append(i)
+        if ac_3:
+            problem.restrict(i, 1 << k)
+            consistent = problem.ac_3([i])
+        elif forward_checking:
+            consistent = problem.forward_check(i)
+        else:
+            consistent = True
+        if consistent and bitset_backtracking(problem, select, ac_3,
+                                              forward_checking, order):
+            return True
+        problem.undo(mark)
+        problem.unassign(i)
+        if order is not None:
+            order.pop()
     return False
 
 
+def backjumping(csp, max_nogoods=1000):
+    """
+    Backtracking with conflict-directed backjumping and nogood learning.
+    The variables are chosen like in backtracking(), but after a dead end
+    the search jumps back to the last variable that caused it instead of
+    the previous one.
+    :param csp: A csp.ConstrainedSatisfactionProblem object
+                representing the CSP to solve
+    :param max_nogoods: The maximum number of learned nogoods, 0 for no
+                        learning
+    :return: A csp.ConstrainedSatisfactionProblem, where all Variables
+             are set and csp.complete() returns True or False if there is
+             no solution
+    """
+    problem = BitsetCSP(csp)
+    nogoods = NogoodStore(max_nogoods) if max_nogoods else None
+    if not problem.consistent():
+        return False
+    solved, conflict = bitset_backjumping(problem, nogoods=nogoods)
+    if not solved:
+        return False
+    return problem.write_back()
+
+
+def bitset_backjumping(problem, select=None, nogoods=None):
+    """
+    Conflict-directed backjumping on a csp.BitsetCSP. The conflict set of
+    a variable contains the assigned variables, whose values ruled out
+    one of its values. If all values fail, the conflict set is returned
+    and the variables that are not in it are unassigned without trying
+    their other values, because they had no part in the failure. The
+    variable in it that was assigned last adds the rest to its own
+    conflict set and tries its next value.
+
+    The assignment of the conflict set of a failed variable is a nogood.
+    It is stored in nogoods and later assignments that complete it fail
+    at once.
+    :param problem: A csp.BitsetCSP
+    :param select: A function that returns the index of the next variable,
+                   first_unassigned if None
+    :param nogoods: A csp.NogoodStore or None
+    :return: A tuple of True and an empty set, if all variables could be
+             assigned, otherwise of False and the conflict set
+    """
+    if problem.unassigned == 0:
+        return True, set()
+
+    i = (select or first_unassigned)(problem)
+    assignment = problem.assignment
+    conflict = set()
+    # the values that are taken by neighbours, their conflicts are added
+    # only at a dead end
+    taken = set()
+    for k in problem.orders[i]:
+        if not problem.domains[i] >> k & 1:
+            continue
+        if not problem.consistent(i, k):
+            taken.add(k)
+            continue
+        if nogoods is not None:
+            culprits = nogoods.violated(i, k, assignment)
+            if culprits is not None:
+                conflict.update(culprits)
+                continue
+        problem.assign(i, k)
+        solved, child_conflict = bitset_backjumping(problem, select, nogoods)
+        if solved:
+            return True, child_conflict
+        problem.unassign(i)
+        if i not in child_conflict:
+            # jump back over i
+            return False, child_conflict
+        child_conflict.discard(i)
+        conflict.update(child_conflict)
+
+    conflict.update(j for j in problem.neighbours[i] if assignment[j] in taken)
+    if nogoods is not None:
+        nogoods.add((j, assignment[j]) for j in conflict)
+    return False, conflict
+
+
 def create_sudoku_csp(sudoku):
     """
     Creates a csp.ConstrainedSatisfactionProblem from a numpy array
@@ -184,68 +289,26 @@ def create_sudoku_csp(sudoku):
     :return: A csp.ConstrainedSatisfactionProblem which can be used
              to solve the sudoku
     """
-    variables, constraints, domain = [], [], [1, 2, 3, 4, 5, 6, 7, 8, 9]
-    i = 1
-    for row in sudoku:
-        ascii = 65
-        for entry in row:
-            if entry == 0:
-                variables.append(csp.Variable(str(i) + chr(ascii), domain, None))
-            else:
-                variables.append(csp.Variable(str(i) + chr(ascii), domain, entry))
-            ascii += 1
-        i += 1
-    
-    #all row constraints
-    a, b = 0, 9
-    for k in range(9):
-        for i, j in itertools.combinations(variables[a:b], 2):
-            constraints.append(csp.UnequalConstraint(i, j))
-        a = b
-        b += 9
-    
-    #all column constraints
-    columnList = []
-    a, i = 0, 0
-    for l in range(9):
-        column = []
-        for k in range(9):
-            column.append(variables[a])
-            a += 9
-        columnList.append(column)
-        i += 1
-        a = i
-        
-    for column in columnList:
-        for i, j in itertools.combinations(column, 2):
-            constraints.append(csp.UnequalConstraint(i, j))
-    
-    #all block constraints
-    a, b = 0, 0
-    block, blocklist = [], []
-    for m in range(3):
-        for l in range(3):
-            for k in range(3):
-                for i in range(81)[b:b+3]:
-                    i = i+a
-                    block.append(variables[i])
-                a = a+9
-            b += 3
-            blocklist.append(block)
-            block = []
-            a=0
-        b += 18 
-        
-    for block in blocklist:
-        for i, j in itertools.combinations(block, 2):
-            add = True
-            for added in constraints:
-                if (added.var1.name is i.name and added.var2.name is j.name) or (added.var1.name is j.name and added.var2.name is i.name):
-                    add = False
-            if add:
-                constraints.append(csp.UnequalConstraint(i, j))  
-    
-    return csp.ConstrainedSatisfactionProblem(variables, constraints)
+    domain = [1, 2, 3, 4, 5, 6, 7, 8, 9]
+    variables = []
+    for index, entry in enumerate(np.asarray(sudoku).ravel().tolist()):
+        name = str(index // 9 + 1) + chr(65 + index % 9)
+        variables.append(csp.Variable(name, domain, entry or None))
+
+    # the indices of the variables in each row, column and 3x3 block
+    rows = [range(row * 9, row * 9 + 9) for row in range(9)]
+    columns = [range(column, 81, 9) for column in range(9)]
+    blocks = [[(row + i) * 9 + column + j for i in range(3) for j in range(3)]
+              for row in range(0, 9, 3) for column in range(0, 9, 3)]
+
+    # add_constraint() skips the pairs of a block in the same row or
+    # column, which are already constrained
+    problem = csp.ConstrainedSatisfactionProblem(variables, [])
+    for unit in rows + columns + blocks:
+        for i, j in itertools.combinations(unit, 2):
+            problem.add_constraint(csp.UnequalConstraint(variables[i],
+                                                         variables[j]))
+    return problem
 
 
 def sudoku_csp_to_array(csp):
@@ -0,0 +1,247 @@
+"""
+A sudoku solver, that solves sudokus as exact cover problems with
+Knuth's Algorithm X and dancing links instead of as a CSP.
+"""
+import numpy as np
+
+
+class ExactCover(object):
+    """
+    An exact cover problem as a sparse matrix of dancing links. The nodes
+    are stored in flat int lists: left, right, up and down are the
+    indices of the neighbour nodes, column the header of the column of a
+    node and row its row. Node 0 is the root and nodes 1 to columns are
+    the column headers, whose size is the number of rows left in the
+    column. Covering a column unlinks its nodes and uncovering links them
+    again in reverse order, so no lists are copied during the search.
+    """
+    def __init__(self, columns, rows):
+        """
+        The constructor of an ExactCover.
+        :param columns: The number of columns. All have to be covered
+        :param rows: A list of rows, each a list of column indices in
+                     range(columns)
+        """
+        n = columns + 1
+        self.left = [n - 1] + range(n - 1)
+        self.right = range(1, n) + [0]
+        self.up = range(n)
+        self.down = range(n)
+        self.column = range(n)
+        self.row = [None] * n
+        self.size = [0] * n
+        # the number of rows tried by the search
+        self.nodes = 0
+
+        left, right, up, down = self.left, self.right, self.up, self.down
+        for r, columns_of_row in enumerate(rows):
+            first = None
+            for c in columns_of_row:
+                c += 1
+                node = len(up)
+                up.append(up[c])
+                down.append(c)
+                down[up[c]] = node
+                up[c] = node
+                self.column.append(c)
+                self.row.append(r)
+                self.size[c] += 1
+                if first is None:
+                    first = node
+                    left.append(node)
+                    right.append(node)
+                else:
+                    left.append(left[first])
+                    right.append(first)
+                    right[left[first]] = node
+                    left[first] = node
+
+    def cover(self, c):
+        """
+        Removes column c and all rows that have a node in it.
+        """
+        left, right, up, down = self.left, self.right, self.up, self.down
+        column, size = self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def uncover(self, c):
+        """
+        Reverts cover(c).
+        """
+        left, right, up, down = self.left, self.right, self.up, self.down
+        column, size = self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+
+    def solve(self):
+        """
+        Searches for a set of rows, which has exactly one node in every
+        column, with Algorithm X. The column with the fewest rows is
+        covered first. The matrix is restored afterwards.
+        :return: A list of row indices or None if there is no solution
+        """
+        solution = []
+        if self.search(solution):
+            return solution
+        return None
+
+    def search(self, solution):
+        """
+        The recursive part of solve().
+        :param solution: The list of the chosen rows, the rows of a
+                         solution are left in it
+        :return: True if a solution was found
+        """
+        right, left, down = self.right, self.left, self.down
+        column, size = self.column, self.size
+        if right[0] == 0:
+            return True
+
+        c = best = right[0]
+        while c != 0:
+            if size[c] < size[best]:
+                best = c
+                if size[c] < 2:
+                    break
+            c = right[c]
+
+        found = False
+        self.cover(best)
+        i = down[best]
+        while i != best:
+            self.nodes += 1
+            solution.append(self.row[i])
+            j = right[i]
+            while j != i:
+                self.cover(column[j])
+                j = right[j]
+            found = self.search(solution)
+            j = left[i]
+            while j != i:
+                self.uncover(column[j])
+                j = left[j]
+            if found:
+                break
+            solution.pop()
+            i = down[i]
+        self.uncover(best)
+        return found
+
+
+def sudoku_cover(sudoku):
+    """
+    Creates the ExactCover of a sudoku of any size n^2 x n^2, e.g. 9x9,
+    16x16 or 25x25. A row is a candidate (row, column, value) of an empty
+    cell and covers four columns: the cell, the value in its row, the
+    value in its column and the value in its block. Columns that the
+    given numbers already cover and candidates that conflict with them
+    are left out, which makes the matrix much smaller.
+    :param sudoku: A numpy array with shape (n^2, n^2), 0 for empty cells
+    :return: A tuple of the ExactCover and the list of the (row, column,
+             value) of each of its rows
+    """
+    sudoku = np.asarray(sudoku)
+    size = sudoku.shape[0]
+    n = int(round(np.sqrt(size)))
+    if sudoku.shape != (size, size) or n * n != size:
+        raise ValueError("a sudoku has to have shape (n^2, n^2)")
+
+    cells = sudoku.astype(int).tolist()
+    rows = [set() for _ in range(size)]
+    columns = [set() for _ in range(size)]
+    blocks = [set() for _ in range(size)]
+    conflict = False
+    for r in range(size):
+        for c in range(size):
+            value = cells[r][c]
+            if value:
+                b = r // n * n + c // n
+                if value in rows[r] or value in columns[c] or \
+                        value in blocks[b] or not 0 < value <= size:
+                    conflict = True
+                rows[r].add(value)
+                columns[c].add(value)
+                blocks[b].add(value)
+
+    # the index of each column of the matrix that is still open. A column
+    # without candidates, e.g. an empty cell where every value is taken,
+    # stays empty, so that there is no solution
+    index = {}
+    for r in range(size):
+        for c in range(size):
+            if not cells[r][c]:
+                index[('cell', r, c)] = len(index)
+    for unit in range(size):
+        for value in range(1, size + 1):
+            for name, taken in (('row', rows), ('column', columns),
+                                ('block', blocks)):
+                if value not in taken[unit]:
+                    index[(name, unit, value)] = len(index)
+
+    candidates, matrix = [], []
+    for r in range(size):
+        for c in range(size):
+            if cells[r][c]:
+                continue
+            b = r // n * n + c // n
+            for value in range(1, size + 1):
+                if value in rows[r] or value in columns[c] or \
+                        value in blocks[b]:
+                    continue
+                matrix.append([index[('cell', r, c)], index[('row', r, value)],
+                               index[('column', c, value)],
+                               index[('block', b, value)]])
+                candidates.append((r, c, value))
+
+    # conflicting givens add a column that can not be covered
+    return ExactCover(len(index) + conflict, matrix), candidates
+
+
+def cover_to_array(sudoku, candidates, solution):
+    """
+    Writes the candidates of a solution of sudoku_cover() into a copy of
+    the sudoku.
+    :param sudoku: The numpy array given to sudoku_cover()
+    :param candidates: The candidates returned by sudoku_cover()
+    :param solution: A list of row indices from ExactCover.solve()
+    :return: A numpy array with the same shape and dtype as the arrays of
+             ex_csp.sudoku_csp_to_array()
+    """
+    array = np.array(sudoku, dtype=float)
+    for i in solution:
+        r, c, value = candidates[i]
+        array[r, c] = value
+    return array
+
+
+def solve_sudoku(sudoku):
+    """
+    Solves a sudoku of any size n^2 x n^2 as exact cover problem.
+    :param sudoku: A numpy array with shape (n^2, n^2), 0 for empty cells
+    :return: The solved sudoku like from ex_csp.sudoku_csp_to_array() or
+             False if there is no solution
+    """
+    cover, candidates = sudoku_cover(sudoku)
+    solution = cover.solve()
+    if solution is None:
+        return False
+    return cover_to_array(sudoku, candidates, solution)
@@ -1,9 +1,13 @@
 __author__ = 'johannes'
 
 import ex_csp as ex
+import csp
 import unittest
 import numpy as np
 import itertools
+import StringIO
+import batch_sudoku
+import exact_cover
 from data import create_map_csp
 
 
@@ -106,6 +110,428 @@ class SudokuTest(unittest.TestCase):
         self.assertTrue(solution.complete())
 
 
+class ConstraintIndexTest(unittest.TestCase):
+    def test_constraints_for_variable(self):
+        problem = create_map_csp()
+        for var in problem.variables:
+            expected = [c for c in problem.constraints
+                        if var.name in [c.var1.name, c.var2.name]]
+            self.assertEqual(list(problem.get_constraints_for_variable(var)),
+                             expected)
+
+    def test_add_constraint(self):
+        problem = create_map_csp()
+        hessen, bayern = problem.variables[9], problem.variables[15]
+        self.assertTrue(problem.has_constraint(bayern, hessen))
+        self.assertFalse(problem.add_constraint(
+            csp.UnequalConstraint(bayern, hessen)))
+        berlin = problem.variables[7]
+        self.assertFalse(problem.has_constraint(berlin, bayern))
+        self.assertTrue(problem.add_constraint(
+            csp.UnequalConstraint(berlin, bayern)))
+        self.assertTrue(problem.has_constraint(bayern, berlin))
+        self.assertIn(berlin, bayern.peers)
+        self.assertEqual(len(problem.constraints), 30)
+
+    def test_duplicate_constraints(self):
+        a, b, c = [csp.Variable(name, [1, 2], None) for name in 'abc']
+        constraints = [csp.UnequalConstraint(a, b),
+                       csp.UnequalConstraint(b, a),
+                       csp.UnequalConstraint(b, c),
+                       csp.UnequalConstraint(a, b)]
+        problem = csp.ConstrainedSatisfactionProblem([a, b, c], constraints)
+        self.assertListEqual(problem.constraints,
+                             [constraints[0], constraints[2]])
+        self.assertEqual(len(problem.pairs), len(problem.constraints))
+        self.assertListEqual(a.peers, [b])
+        self.assertListEqual(b.peers, [a, c])
+        self.assertEqual(len(list(problem.get_constraints_for_variable(b))),
+                         2)
+
+    def test_sudoku_csp(self):
+        sudoku = ex.read_sudokus()[0]
+        problem = ex.create_sudoku_csp(sudoku)
+        self.assertEqual(len(problem.constraints), 810)
+        self.assertEqual(len(problem.pairs), 810)
+        self.assertEqual(problem.variables[11].name, "2C")
+        for var in problem.variables:
+            self.assertEqual(len(var.peers), 20)
+            self.assertEqual(len(set(var.peers)), 20)
+        self.assertTrue(np.all(ex.sudoku_csp_to_array(problem) == sudoku))
+
+
+class BitsetCSPTest(unittest.TestCase):
+    def setUp(self):
+        self.csp = create_map_csp()
+        self.problem = csp.BitsetCSP(self.csp)
+
+    def test_index(self):
+        self.assertEqual(self.problem.values, ['c', 'm', 'y', 'k'])
+        self.assertTrue(all(d == 0b1111 for d in self.problem.domains))
+        self.assertEqual(sum(len(n) for n in self.problem.neighbours),
+                         2 * len(self.csp.constraints))
+        for var in self.csp.variables:
+            i = self.problem.index[var]
+            self.assertEqual(
+                sorted(self.problem.variables[j].name
+                       for j in self.problem.neighbours[i]),
+                sorted(peer.name for peer in var.peers))
+
+    def test_incremental_consistency(self):
+        index = dict((var.name, i)
+                     for i, var in enumerate(self.problem.variables))
+        i, j = index["Niedersachsen"], index["Bremen"]
+        self.problem.assign(i, 2)
+        self.assertFalse(self.problem.consistent(j, 2))
+        self.assertTrue(self.problem.consistent(j, 1))
+        self.assertEqual(self.problem.legal_values(j), 0b1011)
+        self.problem.assign(j, 2)
+        self.assertFalse(self.problem.consistent())
+        self.problem.unassign(j)
+        self.assertTrue(self.problem.consistent())
+        self.assertEqual(self.problem.unassigned, 15)
+
+    def test_write_back(self):
+        self.assertTrue(ex.bitset_backtracking(self.problem))
+        self.assertTrue(self.problem.complete())
+        solution = self.problem.write_back()
+        self.assertIs(solution, self.csp)
+        self.assertTrue(solution.complete())
+
+    def test_givens_are_kept(self):
+        sudoku = ex.read_sudokus()[12]
+        solution = ex.sudoku_csp_to_array(
+            ex.backtracking(ex.create_sudoku_csp(sudoku)))
+        sudoku_checker(self, solution)
+        self.assertTrue(np.all(solution[sudoku > 0] == sudoku[sudoku > 0]))
+
+    def test_inconsistent_givens(self):
+        sudoku = ex.read_sudokus()[1]
+        sudoku[0, :2] = 5
+        self.assertFalse(ex.backtracking(ex.create_sudoku_csp(sudoku)))
+
+    def test_unsolvable(self):
+        for var in self.csp.variables:
+            var.domain = ['c', 'm']
+        self.assertFalse(ex.backtracking(self.csp))
+        self.assertTrue(all(var.value is None for var in self.csp.variables))
+
+
+class PropagationTest(unittest.TestCase):
+    def setUp(self):
+        self.sudokus = ex.read_sudokus()
+
+    def solve(self, sudoku, ac_3=False, forward_checking=False):
+        problem = csp.BitsetCSP(ex.create_sudoku_csp(sudoku))
+        self.assertTrue(ex.bitset_solve(problem, ex.first_unassigned, ac_3,
+                                        forward_checking))
+        self.assertTrue(problem.complete())
+        return problem.nodes
+
+    def test_fewer_nodes(self):
+        sudoku = self.sudokus[12]
+        nodes = self.solve(sudoku)
+        forward_checking_nodes = self.solve(sudoku, forward_checking=True)
+        ac_3_nodes = self.solve(sudoku, ac_3=True)
+        self.assertLess(forward_checking_nodes, nodes)
+        self.assertLess(ac_3_nodes, forward_checking_nodes)
+        self.assertLess(ac_3_nodes * 100, nodes)
+
+    def test_ac_3_without_backtracking(self):
+        # the first sudoku is solved by propagation alone
+        sudoku = self.sudokus[0]
+        self.assertEqual(self.solve(sudoku, ac_3=True), np.sum(sudoku == 0))
+
+    def test_solutions(self):
+        for ac_3, forward_checking in [(True, False), (False, True)]:
+            solution = ex.backtracking(
+                ex.create_sudoku_csp(self.sudokus[34]), ac_3=ac_3,
+                forward_checking=forward_checking)
+            sudoku_checker(self, ex.sudoku_csp_to_array(solution))
+            solution, order = ex.minimum_remaining_values_with_degree(
+                create_map_csp(), ac_3=ac_3,
+                forward_checking=forward_checking)
+            self.assertTrue(solution.complete())
+            self.assertEqual(len(order), 16)
+
+    def test_ac_3_same_as_revising_all_arcs(self):
+        # ac_3() queues variables instead of arcs, it has to remove the
+        # same values as revising all arcs until nothing changes
+        conflict = np.array(self.sudokus[3])
+        conflict[0, :2] = 5
+        for sudoku in self.sudokus[:10] + [conflict]:
+            problem = csp.BitsetCSP(ex.create_sudoku_csp(sudoku))
+            for i, k in enumerate(problem.assignment):
+                if k is not None:
+                    problem.restrict(i, 1 << k)
+            domains = list(problem.domains)
+            changed = True
+            while changed:
+                changed = False
+                for i, j, k in itertools.product(range(81), range(81),
+                                                 range(9)):
+                    # k has no support if j can only take k
+                    if j in problem.neighbours[i] and domains[i] >> k & 1 \
+                            and not domains[j] & ~(1 << k):
+                        domains[i] &= ~(1 << k)
+                        changed = True
+            consistent = problem.ac_3()
+            self.assertEqual(consistent, all(domains))
+            if consistent:
+                self.assertListEqual(problem.domains, domains)
+
+    def test_undo(self):
+        problem = csp.BitsetCSP(ex.create_sudoku_csp(self.sudokus[1]))
+        domains = list(problem.domains)
+        mark = len(problem.trail)
+        problem.assign(0, 3)
+        problem.restrict(0, 1 << 3)
+        self.assertTrue(problem.ac_3([0]))
+        self.assertNotEqual(problem.domains, domains)
+        problem.undo(mark)
+        self.assertEqual(problem.domains, domains)
+
+    def test_ac_3_detects_failure(self):
+        a, b, c = [csp.Variable(name, ['r', 'g']) for name in 'abc']
+        problem = csp.ConstrainedSatisfactionProblem(
+            [a, b, c], [csp.UnequalConstraint(a, b),
+                        csp.UnequalConstraint(b, c),
+                        csp.UnequalConstraint(a, c)])
+        bitset = csp.BitsetCSP(problem)
+        bitset.assign(0, 0)
+        bitset.restrict(0, 1)
+        self.assertFalse(bitset.ac_3())
+        self.assertFalse(ex.backtracking(problem, ac_3=True))
+        self.assertFalse(ex.backtracking(problem, forward_checking=True))
+
+
+class IncrementalCountsTest(unittest.TestCase):
+    def check(self, problem):
+        assignment = problem.assignment
+        for i, neighbours in enumerate(problem.neighbours):
+            taken = 0
+            for j in neighbours:
+                if assignment[j] is not None:
+                    taken |= 1 << assignment[j]
+            self.assertEqual(problem.legal_values(i),
+                             problem.domains[i] & ~taken)
+            self.assertEqual(problem.degrees[i],
+                             sum(1 for j in neighbours
+                                 if assignment[j] is None))
+        for degree in [False, True]:
+            unassigned = [i for i, k in enumerate(assignment) if k is None]
+            expected = min(unassigned, key=lambda i: (
+                csp.popcount(problem.legal_values(i)),
+                -problem.degrees[i] if degree else 0, i))
+            self.assertEqual(problem.minimum_remaining(degree), expected)
+
+    def test_random_changes(self):
+        sudoku = ex.read_sudokus()[5]
+        problem = csp.BitsetCSP(ex.create_sudoku_csp(sudoku))
+        random = np.random.RandomState(0)
+        self.check(problem)
+        marks = []
+        for step in range(300):
+            unassigned = [i for i, k in enumerate(problem.assignment)
+                          if k is None]
+            action = random.randint(3)
+            if action == 0 and unassigned:
+                i = unassigned[random.randint(len(unassigned))]
+                problem.assign(i, random.randint(9))
+                marks.append((len(problem.trail), i))
+            elif action == 1 and marks:
+                mark, i = marks.pop()
+                problem.undo(mark)
+                problem.unassign(i)
+            elif unassigned:
+                i = unassigned[random.randint(len(unassigned))]
+                problem.restrict(i, problem.domains[i] &
+                                 ~(1 << random.randint(9)))
+            self.check(problem)
+
+    def test_map_order(self):
+        problem = csp.BitsetCSP(create_map_csp())
+        order = []
+        self.assertTrue(ex.bitset_solve(problem, ex.minimum_remaining,
+                                        order=order))
+        self.assertEqual(problem.variables[order[0]].name,
+                         "Schleswig-Holstein")
+        self.assertIsNotNone(problem.heap)
+        self.assertLessEqual(len(problem.heap), 8 * 16 + 64)
+
+
+class BatchSudokuTest(unittest.TestCase):
+    def test_read_grids(self):
+        with open("sudoku.txt", "r") as f:
+            puzzles = list(batch_sudoku.read_puzzles(f))
+        self.assertEqual(len(puzzles), 50)
+        self.assertEqual(puzzles[0][0], "Grid 01")
+        for (name, puzzle), sudoku in zip(puzzles, ex.read_sudokus()):
+            self.assertEqual(puzzle, ''.join(str(c) for c in sudoku.ravel()))
+
+    def test_read_lines(self):
+        lines = ["4.....8.5.3..........7......2.....6.....8.4......1......."
+                 "6.3.7.5..2.....1.4......\n", "\n",
+                 "0" * 81 + "\n"]
+        puzzles = list(batch_sudoku.read_puzzles(lines))
+        self.assertEqual([name for name, puzzle in puzzles], ["1", "2"])
+        self.assertEqual(puzzles[0][1][:9], "400000805")
+        with self.assertRaises(ValueError):
+            list(batch_sudoku.read_puzzles(["Grid 01", "123456789"]))
+        with self.assertRaises(ValueError):
+            list(batch_sudoku.read_puzzles(["0" * 82]))
+
+    def test_solve_puzzles(self):
+        with open("sudoku.txt", "r") as f:
+            puzzles = list(itertools.islice(batch_sudoku.read_puzzles(f), 6))
+        unsolvable = "11" + "0" * 79
+        puzzles.append(("unsolvable", unsolvable))
+        serial = list(batch_sudoku.solve_puzzles(puzzles, processes=1))
+        csp_results = list(batch_sudoku.solve_puzzles(puzzles, processes=1,
+                                                      solver='csp'))
+        self.assertEqual([r[:3] for r in serial],
+                         [r[:3] for r in csp_results])
+        parallel = list(batch_sudoku.solve_puzzles(puzzles, processes=2,
+                                                   chunksize=2))
+        self.assertEqual([r[:4] for r in serial], [r[:4] for r in parallel])
+        for (name, puzzle), result in zip(puzzles, serial):
+            self.assertEqual(result[:2], (name, puzzle))
+            if name == "unsolvable":
+                self.assertIsNone(result[2])
+                continue
+            solution = np.array([int(c) for c in result[2]]).reshape((9, 9))
+            sudoku_checker(self, solution)
+            sudoku = np.array([int(c) for c in puzzle]).reshape((9, 9))
+            self.assertTrue(np.all(solution[sudoku > 0] == sudoku[sudoku > 0]))
+
+        output = StringIO.StringIO()
+        self.assertEqual(batch_sudoku.write_results(serial, output),
+                         (7, 1, sum(r[3] for r in serial)))
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(lines[-1].split("\t")[:2], ["unsolvable", "-"])
+
+
+class ExactCoverTest(unittest.TestCase):
+    def test_knuth_example(self):
+        # the example from Knuth's paper "Dancing Links"
+        rows = [[2, 4, 5], [0, 3, 6], [1, 2, 5], [0, 3], [1, 6], [3, 4, 6]]
+        cover = exact_cover.ExactCover(7, rows)
+        links = [list(cover.left), list(cover.right), list(cover.up),
+                 list(cover.down), list(cover.size)]
+        self.assertEqual(sorted(cover.solve()), [0, 3, 4])
+        self.assertEqual([cover.left, cover.right, cover.up, cover.down,
+                          cover.size], links)
+        self.assertIsNone(exact_cover.ExactCover(3, [[0, 1], [1, 2]]).solve())
+
+    def test_same_arrays_as_csp(self):
+        sudokus = ex.read_sudokus()
+        for i in [1, 34, 23]:
+            solution = exact_cover.solve_sudoku(sudokus[i])
+            expected = ex.sudoku_csp_to_array(
+                ex.backtracking(ex.create_sudoku_csp(sudokus[i]), ac_3=True))
+            self.assertEqual(solution.dtype, expected.dtype)
+            self.assertEqual(solution.shape, (9, 9))
+            self.assertTrue(np.all(solution == expected))
+
+    def test_larger_sudokus(self):
+        random = np.random.RandomState(2)
+        for n in [4, 5]:
+            size = n * n
+            values = random.permutation(size) + 1
+            grid = np.array([[values[(n * (r % n) + r // n + c) % size]
+                              for c in range(size)] for r in range(size)])
+            sudoku = np.where(random.rand(size, size) < 0.3, 0, grid)
+            solution = exact_cover.solve_sudoku(sudoku)
+            self.assertEqual(solution.shape, (size, size))
+            self.assertTrue(np.all(solution[sudoku > 0] == sudoku[sudoku > 0]))
+            blocks = solution.reshape((n, n, n, n)).swapaxes(1, 2)
+            for i in range(size):
+                self.assertEqual(len(set(solution[i, :])), size)
+                self.assertEqual(len(set(solution[:, i])), size)
+                self.assertEqual(len(set(blocks[i // n, i % n].ravel())), size)
+
+    def test_no_solution(self):
+        sudoku = ex.read_sudokus()[1]
+        sudoku[0, :2] = 5
+        self.assertIs(exact_cover.solve_sudoku(sudoku), False)
+        sudoku = np.zeros((9, 9), dtype=int)
+        sudoku[0, :8] = range(1, 9)
+        sudoku[1, 8] = 9
+        self.assertIs(exact_cover.solve_sudoku(sudoku), False)
+        with self.assertRaises(ValueError):
+            exact_cover.solve_sudoku(np.zeros((8, 8)))
+
+
+class BackjumpingTest(unittest.TestCase):
+    def map_with_clique(self, states, clique):
+        """
+        The first states of the map colouring CSP and an unrelated clique
+        of clique variables, which can not be coloured with four colours.
+        """
+        problem = create_map_csp()
+        variables = problem.variables[:states]
+        constraints = [c for c in problem.constraints
+                       if c.var1 in variables and c.var2 in variables]
+        cliques = [csp.Variable("K{}".format(i), variables[0].domain)
+                   for i in range(clique)]
+        constraints += [csp.UnequalConstraint(a, b)
+                        for a, b in itertools.combinations(cliques, 2)]
+        for var in variables:
+            var.peers = []
+        return csp.ConstrainedSatisfactionProblem(variables + cliques,
+                                                  constraints)
+
+    def test_map_coloring(self):
+        solution = ex.backjumping(create_map_csp())
+        self.assertTrue(solution.complete())
+        self.assertFalse(ex.backjumping(self.map_with_clique(16, 5)))
+
+    def test_jumps_over_unrelated_variables(self):
+        problem = csp.BitsetCSP(self.map_with_clique(8, 5))
+        self.assertFalse(ex.bitset_solve(problem))
+        backtracking_nodes = problem.nodes
+        for nogoods in [None, csp.NogoodStore()]:
+            problem = csp.BitsetCSP(self.map_with_clique(8, 5))
+            solved, conflict = ex.bitset_backjumping(problem, nogoods=nogoods)
+            self.assertFalse(solved)
+            # only the clique is to blame
+            self.assertTrue(all(problem.variables[i].name.startswith("K")
+                                for i in conflict))
+            self.assertLess(problem.nodes * 100, backtracking_nodes)
+
+    def test_sudoku(self):
+        sudokus = ex.read_sudokus()
+        for i in [1, 34, 23]:
+            solution = ex.backjumping(ex.create_sudoku_csp(sudokus[i]))
+            sudoku_checker(self, ex.sudoku_csp_to_array(solution))
+        problem = csp.BitsetCSP(ex.create_sudoku_csp(sudokus[30]))
+        self.assertTrue(ex.bitset_solve(problem))
+        backtracking_nodes = problem.nodes
+        problem = csp.BitsetCSP(ex.create_sudoku_csp(sudokus[30]))
+        nogoods = csp.NogoodStore(100)
+        self.assertTrue(ex.bitset_backjumping(problem, nogoods=nogoods)[0])
+        self.assertTrue(problem.complete())
+        self.assertLess(problem.nodes, backtracking_nodes)
+        self.assertLessEqual(len(nogoods), 100)
+
+    def test_nogood_store(self):
+        nogoods = csp.NogoodStore(2)
+        assignment = [0, 1, 2, None]
+        nogoods.add([(0, 0), (1, 1)])
+        nogoods.add([(1, 1), (2, 0)])
+        self.assertIsNone(nogoods.violated(3, 5, assignment))
+        nogoods.add([(0, 0), (3, 5)])
+        self.assertEqual(nogoods.violated(3, 5, assignment), [0])
+        # the least recently used nogood is evicted
+        nogoods.add([(2, 2), (3, 1)])
+        self.assertEqual(len(nogoods), 2)
+        self.assertEqual(nogoods.evicted, 2)
+        self.assertEqual(nogoods.violated(3, 5, assignment), [0])
+        self.assertEqual(nogoods.violated(3, 1, assignment), [2])
+        self.assertFalse(nogoods.watches[(1, 1)])
+
+
 def all_different(array):
     flat_array = array.reshape((9,))
     for i, j in itertools.combinations(flat_array, 2):